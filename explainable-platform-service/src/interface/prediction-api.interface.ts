@@ -27,3 +27,109 @@ export interface IDataframeSplitRequest {
     data: number[][];
   };
 }
+
+export type ExplainOutput =
+  | 'predict'
+  | 'heatmap'
+  | 'beeswarm'
+  | 'waterfall'
+  | 'shap_values';
+
+// Only 'interventional' gives the exact SHAP values of the logged explainer, 'fast' is
+// path-dependent TreeSHAP: locally accurate, but numerically different from them
+export type ShapMode = 'interventional' | 'fast' | 'approximate';
+
+export type FeaturePerturbation = 'interventional' | 'tree_path_dependent' | 'saabas';
+
+export type ResponseFormat = 'json' | 'image' | 'multipart' | 'key';
+
+export interface IExplainRequest extends IDataframeSplitRequest {
+  outputs: ExplainOutput[];
+  shap_mode?: ShapMode;
+  tree_fraction?: number;
+  class_index?: number | 'all';
+  // 'data' returns the numbers behind each plot instead of PNGs
+  render?: 'png' | 'data';
+  array_encoding?: 'list' | 'float32';
+  // 'key' writes the PNGs to the runtime's plot store and returns their object keys
+  // in place of the images, under store_prefix when given
+  response_format?: ResponseFormat;
+  store_prefix?: string;
+  // Stream 'predict' and 'waterfall' as NDJSON, see IExplainStreamRow
+  stream?: boolean;
+  // 'auto' draws heatmap and beeswarm with bounded work above the runtime's LARGE_COHORT_ROWS
+  cohort_rendering?: 'auto' | 'full' | 'reduced';
+}
+
+export interface ICohortRendering {
+  mode: 'full' | 'reduced';
+  rows: number;
+  beeswarm_max_points?: number;
+  heatmap_max_columns?: number;
+}
+
+// Explanations below are for a single class, class_index 'all' keys each of them by class index
+export interface IExplainResponse {
+  predict?: IPredictResponse['predict'];
+  heatmap?: string;
+  beeswarm?: string;
+  waterfall?: IWaterfallResponse['explain'];
+  class_index?: number | 'all';
+  shap_mode?: ShapMode;
+  feature_perturbation?: FeaturePerturbation;
+  tree_fraction?: number;
+  cohort_rendering?: ICohortRendering;
+  shap_values?: {
+    base_value: number;
+    feature_names: string[];
+    ids: string[];
+    values: number[][];
+  };
+  // Bucket of the object keys, response_format 'key' only
+  bucket?: string;
+}
+
+// Lines of a streamed response after the first one, which holds class_index,
+// shap_mode, feature_perturbation, tree_fraction and the number of rows. Rows arrive as they finish.
+export interface IExplainStreamRow {
+  id: string;
+  waterfall?: string;
+  predict?: IPredictResponse['predict'][number];
+  error?: string;
+}
+
+// Async job of the runtime's /v1/jobs/<kind>/<model_name>, which takes the body of the
+// matching synchronous endpoint; GET /v1/jobs/<job_id>/result returns its response
+export type ExplainJobKind =
+  | 'explain'
+  | 'predict'
+  | 'heatmap'
+  | 'beeswarm'
+  | 'waterfall';
+
+export type ExplainJobStatus =
+  | 'queued'
+  | 'running'
+  | 'succeeded'
+  | 'failed'
+  | 'cancelled';
+
+export interface IExplainJob {
+  job_id: string;
+  kind: ExplainJobKind;
+  model_name: string;
+  status: ExplainJobStatus;
+  created_at: number;
+  started_at?: number;
+  finished_at?: number;
+  seconds?: number;
+  attempts: number;
+  // Streamed jobs ('stream': true) only
+  progress: {
+    rows?: number;
+    rows_done?: number;
+  };
+  status_code?: number;
+  content_type?: string;
+  error?: string;
+}
@@ -9,11 +9,8 @@ import { PredictionRecord } from '../entity/prediction-record.entity';
 import { StorageService } from '../storage/storage.service';
 import { ConfigService } from '@nestjs/config';
 import {
-  IBeeswarmResponse,
-  IDataframeSplitRequest,
-  IHeatmapResponse,
-  IPredictResponse,
-  IWaterfallResponse,
+  IExplainRequest,
+  IExplainResponse,
 } from 'src/interface/prediction-api.interface';
 import { PredictionStatus } from 'src/interface/prediction-class.enum';
 
@@ -21,6 +18,9 @@ import { PredictionStatus } from 'src/interface/prediction-class.enum';
 export class PredictionProcessor {
   private inferenceServiceURL: string;
   private hostHeader = 'kserve-custom-inference-service.default.example.com';
+  // The inference service writes plots to AWS_S3_BUCKET itself (its PLOT_STORE_BUCKET,
+  // with PLOT_STORE_PREFIX 'predictions') and returns keys instead of base64 PNGs
+  private inferenceWritesPlots: boolean;
 
   constructor(
     private httpService: HttpService,
@@ -33,6 +33,8 @@ export class PredictionProcessor {
   ) {
     this.inferenceServiceURL =
       this.configService.get<string>('INFERENCE_SERVICE_URL') ?? '';
+    this.inferenceWritesPlots =
+      this.configService.get<string>('INFERENCE_WRITES_PLOTS') === 'true';
   }
 
   @Process('processPrediction')
@@ -58,44 +60,44 @@ export class PredictionProcessor {
 
     const dataframe_split_data = records.map((record) => record.dfData);
 
-    const dataframe_split: IDataframeSplitRequest = {
+    const explainRequest: IExplainRequest = {
       dataframe_split: {
         columns: prediction.dfColumns,
         data: dataframe_split_data,
       },
+      outputs: ['heatmap', 'beeswarm'],
+      ...(this.inferenceWritesPlots && {
+        response_format: 'key',
+        store_prefix: predictionId,
+      }),
     };
 
-    // POST Generate Heatmap
-    const heatmapObservable = this.httpService.post<IHeatmapResponse>(
-      `${this.inferenceServiceURL}/v1/explain/heatmap/${prediction.modelName}`,
-      dataframe_split,
+    // POST Generate Heatmap and Beeswarm from a single SHAP computation
+    const explainObservable = this.httpService.post<IExplainResponse>(
+      `${this.inferenceServiceURL}/v1/explain/${prediction.modelName}`,
+      explainRequest,
       { headers: { Host: this.hostHeader } },
     );
 
-    const heatmapResponse = await lastValueFrom(heatmapObservable);
-    if (heatmapResponse?.data) {
-      const heatmapUrl = await this.storageService.uploadToS3(
-        heatmapResponse.data.explain,
-        predictionId,
-        `heatmap_${predictionId}.png`,
-      );
+    const explainResponse = await lastValueFrom(explainObservable);
+    if (explainResponse?.data?.heatmap) {
+      const heatmapUrl = this.inferenceWritesPlots
+        ? explainResponse.data.heatmap
+        : await this.storageService.uploadToS3(
+            explainResponse.data.heatmap,
+            predictionId,
+            `heatmap_${predictionId}.png`,
+          );
       prediction.heatmap = heatmapUrl;
     }
-
-    // POST Generate Beeswarm
-    const beeswarmObservable = this.httpService.post<IBeeswarmResponse>(
-      `${this.inferenceServiceURL}/v1/explain/beeswarm/${prediction.modelName}`,
-      dataframe_split,
-      { headers: { Host: this.hostHeader } },
-    );
-
-    const beeswarmResponse = await lastValueFrom(beeswarmObservable);
-    if (beeswarmResponse?.data) {
-      const beeswarmUrl = await this.storageService.uploadToS3(
-        beeswarmResponse.data.explain,
-        predictionId,
-        `beeswarm_${predictionId}.png`,
-      );
+    if (explainResponse?.data?.beeswarm) {
+      const beeswarmUrl = this.inferenceWritesPlots
+        ? explainResponse.data.beeswarm
+        : await this.storageService.uploadToS3(
+            explainResponse.data.beeswarm,
+            predictionId,
+            `beeswarm_${predictionId}.png`,
+          );
       prediction.beeswarm = beeswarmUrl;
     }
 
@@ -138,56 +140,46 @@ export class PredictionProcessor {
         return;
       }
       const prediction = record.prediction
-      const dataframe_split: IDataframeSplitRequest = {
+      const explainRequest: IExplainRequest = {
         dataframe_split: {
           columns: record.prediction.dfColumns,
           data: [record.dfData],
         },
+        outputs: ['predict', 'waterfall'],
+        ...(this.inferenceWritesPlots && {
+          response_format: 'key',
+          store_prefix: `${prediction.id}/${record.id}`,
+        }),
       };
 
-      // Prediction (Proba & Class)
-      try {
-        const predictionObservable = this.httpService.post<IPredictResponse>(
-          `${this.inferenceServiceURL}/v1/predict/${prediction.modelName}`,
-          dataframe_split,
-          { headers: { Host: this.hostHeader } },
-        );
-
-        const predictionResponse = await lastValueFrom(predictionObservable);
-        record.proba = parseFloat(
-          predictionResponse?.data.predict[0].proba.toFixed(4),
-        );
-        record.class = predictionResponse?.data.predict[0].class;
-      } catch (error) {
-        console.error(
-          `[PredictionProcessor] error: prediction API failed for Record ID ${record.id}:`,
-          error.message,
-        );
-        record.status = PredictionStatus.ERROR;
-        record.errorMsg = error.message;
-        await this.recordsRepository.save(record);
-      }
-
-      // POST Generate Waterfall
+      // POST Prediction (Proba & Class) and Waterfall in a single request
       try {
-        const waterfallObservable = this.httpService.post<IWaterfallResponse>(
-          `${this.inferenceServiceURL}/v1/explain/waterfall/${prediction.modelName}`,
-          dataframe_split,
+        const explainObservable = this.httpService.post<IExplainResponse>(
+          `${this.inferenceServiceURL}/v1/explain/${prediction.modelName}`,
+          explainRequest,
           { headers: { Host: this.hostHeader } },
         );
 
-        const waterfallResponse = await lastValueFrom(waterfallObservable);
-        if (waterfallResponse?.data) {
-          const waterfallUrl = await this.storageService.uploadToS3(
-            waterfallResponse.data.explain[0].waterfall,
-            prediction.id,
-            `waterfall_${record.id}.png`,
-          );
+        const explainResponse = await lastValueFrom(explainObservable);
+        const predict = explainResponse?.data?.predict?.[0];
+        if (predict) {
+          record.proba = parseFloat(predict.proba.toFixed(4));
+          record.class = predict.class;
+        }
+        const waterfall = explainResponse?.data?.waterfall?.[0]?.waterfall;
+        if (waterfall) {
+          const waterfallUrl = this.inferenceWritesPlots
+            ? waterfall
+            : await this.storageService.uploadToS3(
+                waterfall,
+                prediction.id,
+                `waterfall_${record.id}.png`,
+              );
           record.waterfall = waterfallUrl;
         }
       } catch (error) {
         console.error(
-          `[PredictionProcessor] error: waterfall API failed for Record ID ${record.id}:`,
+          `[PredictionProcessor] error: explain API failed for Record ID ${record.id}:`,
           error.message,
         );
         record.status = PredictionStatus.ERROR;
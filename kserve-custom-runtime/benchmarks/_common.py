@@ -0,0 +1,24 @@
+"""
+Scaffold shared by the benchmark scripts: the model server module, the sample CRC data
+and the RandomForest they explain.
+"""
+import importlib
+import os
+import sys
+
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+RUNTIME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DATA = os.path.join(RUNTIME_DIR, "..", "sample-data", "sample.csv")
+
+sys.path.insert(0, RUNTIME_DIR)
+server = importlib.import_module("kserve-shap-multi-modelserver")
+
+def load_sample_data(path=SAMPLE_DATA):
+    """Features and CRC labels of the sample data."""
+    sample_crc = pd.read_csv(path, index_col=0)
+    return sample_crc.drop(["CRC"], axis=1), sample_crc["CRC"]
+
+def fit_random_forest(X, y, n_estimators=100):
+    return RandomForestClassifier(n_estimators=n_estimators, random_state=42).fit(X, y)
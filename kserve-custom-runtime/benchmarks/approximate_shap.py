@@ -0,0 +1,61 @@
+"""
+Benchmark the SHAP modes of the model server against exact interventional SHAP
+on the sample CRC data.
+
+Trains a RandomForest the way mlflow-experiments/sample-rf-crc does, builds the
+interventional explainer with a stratified background, then reports latency,
+speedup and error of every (shap_mode, tree_fraction) the explain endpoints accept.
+
+Usage: python benchmarks/approximate_shap.py [--data ../sample-data/sample.csv] [--n-estimators 500]
+"""
+import argparse
+import time
+
+import numpy as np
+import shap
+from sklearn.model_selection import train_test_split
+
+from _common import SAMPLE_DATA, fit_random_forest, load_sample_data, server
+
+def explain(explainer, X, approximate=False):
+    start = time.perf_counter()
+    rows = server.compute_shap_rows(explainer, X, approximate)
+    # Positive class, as the explain endpoints default to
+    return np.stack([row for row, _ in rows])[:, :, 1], time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=SAMPLE_DATA)
+    parser.add_argument("--n-estimators", type=int, default=500)
+    parser.add_argument("--background-size", type=int, default=50)
+    parser.add_argument("--fractions", type=float, nargs="+", default=[1.0, 0.5, 0.25, 0.1])
+    args = parser.parse_args()
+
+    X, y = load_sample_data(args.data)
+    X_train, X_test, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    model = fit_random_forest(X_train, y_train, n_estimators=args.n_estimators)
+    background, _ = train_test_split(X_train, train_size=args.background_size, stratify=y_train, random_state=0)
+    exact_explainer = shap.Explainer(model, shap.maskers.Independent(background, max_samples=len(background)))
+
+    exact, exact_seconds = explain(exact_explainer, X_test)
+    print(f"{len(X_test)} rows, {args.n_estimators} trees, exact interventional: {exact_seconds:.3f}s")
+    print(f"{'shap_mode':<14}{'fraction':>9}{'seconds':>10}{'speedup':>9}{'rel_mae':>9}{'max_abs':>9}{'top10':>7}")
+
+    for shap_mode in ("fast", "approximate"):
+        for tree_fraction in args.fractions:
+            explainer = server.build_fast_explainer(server.subsample_trees(model, tree_fraction))
+            values, seconds = explain(explainer, X_test, approximate=shap_mode == "approximate")
+            rel_mae = np.mean(np.abs(values - exact)) / np.mean(np.abs(exact))
+            max_abs = np.max(np.abs(values - exact))
+
+            # Share of each row's ten most important exact features that the mode also ranks in its top ten
+            top_exact = np.argsort(-np.abs(exact), axis=1)[:, :10]
+            top_values = np.argsort(-np.abs(values), axis=1)[:, :10]
+            top10 = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(top_exact, top_values)])
+
+            print(f"{shap_mode:<14}{tree_fraction:>9.2f}{seconds:>10.3f}{exact_seconds / seconds:>8.1f}x"
+                  f"{rel_mae:>9.3f}{max_abs:>9.4f}{top10:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare explaining a batch of samples one row per request with the batch waterfall path.
+
+Trains a RandomForest on the sample CRC data, then for --rows rows reports the time of
+predicting, computing SHAP and rendering a waterfall row by row (what one predict and
+one waterfall request per record cost), against predicting and computing SHAP once for
+the batch and rendering the waterfalls on render_pools of each --workers size.
+
+Usage: python benchmarks/batch_waterfall.py [--rows 100] [--workers 1 2 4]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import SAMPLE_DATA, fit_random_forest, load_sample_data, server
+
+def per_row(model, explainer, X):
+    images = []
+    for position in range(len(X)):
+        row = X.iloc[[position]]
+        server.compute_prediction_rows(model, row)
+        shap_object = server.get_shap_value(explainer, row)
+        images.append(server.get_local_waterfall_plot(row.index[0], shap_object))
+    return images
+
+def batch(model, explainer, X):
+    server.compute_prediction_rows(model, X)
+    shap_tensor = server.get_shap_tensor(explainer, X)
+    return [entry["waterfall"] for entry in server.render_output("waterfall", shap_tensor, 1)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=SAMPLE_DATA)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    X, y = load_sample_data(args.data)
+    model = fit_random_forest(X, y)
+    explainer = server.build_fast_explainer(model)
+    X = X.iloc[:args.rows]
+    print(f"{len(X)} rows, {os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    expected = per_row(model, explainer, X)
+    per_row_seconds = time.perf_counter() - start
+    print(f"{'per row':<18}{per_row_seconds:>8.2f}s")
+
+    for workers in args.workers:
+        server.render_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+        start = time.perf_counter()
+        images = batch(model, explainer, X)
+        seconds = time.perf_counter() - start
+        identical = images == expected
+        print(f"{f'batch, {workers} workers':<18}{seconds:>8.2f}s{per_row_seconds / seconds:>7.1f}x  identical images: {identical}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Render explanation plots concurrently and check they match the serial renders.
+
+Explains the sample CRC data with a RandomForest, renders every plot type once
+serially, then renders the same plots --repeat times from --threads threads and
+fails if any image differs byte for byte from its serial version.
+
+Usage: python benchmarks/concurrent_rendering.py [--threads 8] [--repeat 4]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import SAMPLE_DATA, fit_random_forest, load_sample_data, server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=SAMPLE_DATA)
+    parser.add_argument("--rows", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=4)
+    args = parser.parse_args()
+
+    X, y = load_sample_data(args.data)
+    model = fit_random_forest(X, y)
+    X = X.iloc[:args.rows]
+    shap_object = server.get_shap_value(server.build_fast_explainer(model), X)
+
+    plots = {"beeswarm": lambda: server.get_beeswarm(shap_object.explanation),
+             "heatmap": lambda: server.get_heatmap(shap_object.explanation)}
+    for subject_id in X.index[:6]:
+        plots[f"waterfall:{subject_id}"] = lambda subject_id=subject_id: server.get_local_waterfall_plot(subject_id, shap_object)
+
+    start = time.perf_counter()
+    serial = {name: render() for name, render in plots.items()}
+    serial_seconds = time.perf_counter() - start
+
+    jobs = [name for name in plots for _ in range(args.repeat)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        concurrent = list(executor.map(lambda name: (name, plots[name]()), jobs))
+    concurrent_seconds = time.perf_counter() - start
+
+    mismatches = sorted({name for name, image in concurrent if image != serial[name]})
+    print(f"serial: {len(plots)} plots in {serial_seconds:.2f}s")
+    print(f"concurrent: {len(jobs)} plots on {args.threads} threads in {concurrent_seconds:.2f}s")
+    if mismatches:
+        print(f"❌ {len(mismatches)} plots differ from their serial render: {mismatches}")
+        sys.exit(1)
+    print("✅ every concurrent render matches its serial render")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Check how far the "fast" SHAP path of the model server is from the interventional SHAP
+values the "interventional" mode serves.
+
+Trains a RandomForest, a GradientBoosting and an XGBoost classifier on the sample CRC
+data and builds the interventional explainer the experiments log, against a stratified
+--background-size row background of the training split. Then explains the positive
+class of the held-out rows with the explainer build_fast_explainer picks (shap's
+path-dependent TreeExplainer, XGBoostContribExplainer for XGBoost) and checks:
+
+- local accuracy of the fast values: base value plus SHAP values equal the model output
+  (probability for the forest, log-odds for the boosted models), within 1e-4;
+- the distance from interventional SHAP. Path-dependent TreeSHAP conditions on the
+  training cover of each node instead of the background, so it is not numerically equal
+  to interventional SHAP; what the fast mode promises is the same attribution picture.
+  The check bounds the relative MAE (--max-rel-mae) and the share of each row's ten
+  most important interventional features also in its fast top ten (--min-top10);
+- XGBoostContribExplainer against shap's path-dependent TreeExplainer, two
+  implementations of the same algorithm, within 1e-4.
+
+Fails if any check does not hold.
+
+Usage: python benchmarks/fast_shap_fidelity.py [--max-rel-mae 0.35] [--min-top10 0.8]
+"""
+import argparse
+import sys
+
+import numpy as np
+import shap
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.model_selection import train_test_split
+from xgboost import XGBClassifier
+
+from _common import SAMPLE_DATA, fit_random_forest, load_sample_data, server
+
+# float32 tree thresholds and leaf values leave ~1e-6 of rounding, the rest would be a bug
+EXACT_TOLERANCE = 1e-4
+
+def positive_class(values):
+    # shap's TreeExplainer returns (rows, features, classes) for forests, (rows, features) for boosted models
+    return values[:, :, 1] if values.ndim == 3 else values
+
+def top10_overlap(reference, values):
+    top_reference = np.argsort(-np.abs(reference), axis=1)[:, :10]
+    top_values = np.argsort(-np.abs(values), axis=1)[:, :10]
+    return np.mean([len(set(a) & set(b)) / 10 for a, b in zip(top_reference, top_values)])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=SAMPLE_DATA)
+    parser.add_argument("--background-size", type=int, default=50)
+    # Defaults leave headroom over what the sample models measure (rel_mae up to ~0.25, top10 from ~0.87)
+    parser.add_argument("--max-rel-mae", type=float, default=0.35)
+    parser.add_argument("--min-top10", type=float, default=0.8)
+    args = parser.parse_args()
+
+    X, y = load_sample_data(args.data)
+    X_train, X_test, y_train, _ = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+    background, _ = train_test_split(X_train, train_size=args.background_size, stratify=y_train, random_state=0)
+    models = {
+        "random_forest": (fit_random_forest(X_train, y_train), lambda model: model.predict_proba(X_test)[:, 1]),
+        "gradient_boosting": (GradientBoostingClassifier(random_state=42).fit(X_train, y_train), lambda model: model.decision_function(X_test)),
+        "xgboost": (XGBClassifier(n_estimators=100, random_state=42).fit(X_train, y_train), lambda model: model.predict(X_test, output_margin=True)),
+    }
+
+    print(f"{len(X_test)} held-out rows, {len(background)} background rows")
+    print(f"{'model':<20}{'fast_explainer':<26}{'additivity_err':>15}{'rel_mae':>9}{'top10':>7}{'impl_diff':>11}")
+    failures = []
+    for name, (model, model_output) in models.items():
+        explainer = server.build_fast_explainer(model)
+        rows = server.compute_shap_rows(explainer, X_test)
+        values = np.stack([row[:, 1] for row, _ in rows])
+        base_value = rows[0][1][1]
+        additivity = np.max(np.abs(base_value + values.sum(axis=1) - model_output(model)))
+
+        interventional = positive_class(shap.TreeExplainer(model, data=background, feature_perturbation="interventional").shap_values(X_test))
+        rel_mae = np.mean(np.abs(values - interventional)) / np.mean(np.abs(interventional))
+        top10 = top10_overlap(interventional, values)
+
+        impl_diff = 0.0
+        if isinstance(explainer, server.XGBoostContribExplainer):
+            path_dependent = shap.TreeExplainer(model, feature_perturbation="tree_path_dependent")
+            impl_diff = np.max(np.abs(values - positive_class(path_dependent.shap_values(X_test))))
+
+        print(f"{name:<20}{type(explainer).__name__:<26}{additivity:>15.2e}{rel_mae:>9.3f}{top10:>7.2f}{impl_diff:>11.2e}")
+        if additivity > EXACT_TOLERANCE or impl_diff > EXACT_TOLERANCE or rel_mae > args.max_rel_mae or top10 < args.min_top10:
+            failures.append(name)
+
+    if failures:
+        print(f"❌ fast SHAP is outside the tolerances (rel_mae <= {args.max_rel_mae}, top10 >= {args.min_top10}, exact checks <= {EXACT_TOLERANCE}) for {failures}")
+        sys.exit(1)
+    print("✅ fast SHAP is locally accurate and within the tolerances of interventional SHAP for every model")
+
+if __name__ == "__main__":
+    main()
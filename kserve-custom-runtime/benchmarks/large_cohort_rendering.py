@@ -0,0 +1,49 @@
+"""
+Render time and PNG size of the heatmap and beeswarm for large cohorts, drawn in full
+and with the reduced large-cohort rendering.
+
+Explains the sample CRC data with a RandomForest, then builds cohorts of --rows rows by
+resampling the explained rows with a little noise on their SHAP values, and renders
+both plots of each cohort both ways.
+
+Usage: python benchmarks/large_cohort_rendering.py [--rows 1000 10000 100000]
+"""
+import argparse
+import time
+
+import numpy as np
+import shap
+
+from _common import SAMPLE_DATA, fit_random_forest, load_sample_data, server
+
+def build_cohort(shap_object, X, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(X), rows)
+    values = shap_object.shap_df.to_numpy()
+    noise = rng.standard_normal((rows, values.shape[1])) * 0.1 * values.std(0)
+    return shap.Explanation(values[picks] + noise, data=X.to_numpy()[picks], feature_names=list(X.columns))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=SAMPLE_DATA)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    X, y = load_sample_data(args.data)
+    model = fit_random_forest(X, y)
+    shap_object = server.get_shap_value(server.build_fast_explainer(model), X)
+
+    print(f"{'rows':>8}{'plot':>10}{'full_s':>9}{'full_KB':>9}{'reduced_s':>11}{'reduced_KB':>12}{'speedup':>9}")
+    for rows in args.rows:
+        explanation = build_cohort(shap_object, X, rows)
+        for plot, render in (("heatmap", server.get_heatmap), ("beeswarm", server.get_beeswarm)):
+            results = []
+            for reduced in (False, True):
+                start = time.perf_counter()
+                png = render(explanation, reduced=reduced)
+                results.append((time.perf_counter() - start, len(png) / 1024))
+            (full_s, full_kb), (reduced_s, reduced_kb) = results
+            print(f"{rows:>8}{plot:>10}{full_s:>9.2f}{full_kb:>9.0f}{reduced_s:>11.2f}{reduced_kb:>12.0f}{full_s / reduced_s:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare single-row predictions from concurrent callers with and without the predict
+micro-batcher.
+
+Trains a RandomForest on the sample CRC data, then predicts --requests single-row
+requests from --threads threads, once straight through compute_prediction_rows and
+once through a PredictBatcher of each --wait-ms, reporting throughput, latency and
+the batch size and queue wait histograms.
+
+Usage: python benchmarks/predict_micro_batching.py [--requests 2000] [--threads 16] [--wait-ms 1 5]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from _common import SAMPLE_DATA, fit_random_forest, load_sample_data, server
+
+def run(predict, rows, threads):
+    def call(row):
+        start = time.perf_counter()
+        result = predict(row)
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(call, rows))
+    seconds = time.perf_counter() - start
+    latencies = np.array([latency for _, latency in results]) * 1000
+    return [result for result, _ in results], seconds, latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=SAMPLE_DATA)
+    parser.add_argument("--n-estimators", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--wait-ms", type=float, nargs="+", default=[1, 5])
+    parser.add_argument("--max-rows", type=int, default=64)
+    args = parser.parse_args()
+
+    X, y = load_sample_data(args.data)
+    model = fit_random_forest(X, y, n_estimators=args.n_estimators)
+    rows = [X.iloc[[i % len(X)]] for i in range(args.requests)]
+    print(f"{args.requests} single-row requests from {args.threads} threads, {args.n_estimators} trees, {os.cpu_count()} CPUs")
+    print(f"{'mode':<16}{'req/s':>9}{'p50_ms':>9}{'p99_ms':>9}{'mean_rows':>11}{'mean_wait_ms':>14}")
+
+    expected, seconds, latencies = run(lambda row: server.compute_prediction_rows(model, row), rows, args.threads)
+    print(f"{'unbatched':<16}{len(rows) / seconds:>9.0f}{np.percentile(latencies, 50):>9.1f}{np.percentile(latencies, 99):>9.1f}")
+
+    for wait_ms in args.wait_ms:
+        batcher = server.PredictBatcher(max_wait_ms=wait_ms, max_rows=args.max_rows)
+        results, seconds, latencies = run(lambda row: batcher.compute(model, "benchmark", row), rows, args.threads)
+        stats = batcher.stats()
+        print(f"{f'batched {wait_ms}ms':<16}{len(rows) / seconds:>9.0f}{np.percentile(latencies, 50):>9.1f}"
+              f"{np.percentile(latencies, 99):>9.1f}{stats['batch_rows']['mean']:>11.1f}{stats['queue_wait_ms']['mean']:>14.2f}"
+              f"  identical predictions: {results == expected}")
+
+if __name__ == "__main__":
+    main()
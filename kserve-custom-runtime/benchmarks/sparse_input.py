@@ -0,0 +1,88 @@
+"""
+Compare the dense ("dataframe_split") and sparse ("sparse_split") input paths of
+the model server on a wide synthetic abundance table.
+
+Trains a RandomForest on the sample CRC data, then builds a table with the model's
+taxa plus --extra-taxa unknown taxa at --density non-zero entries, and reports the
+request size, latency and peak traced memory of parsing, feature alignment and
+prediction for each input format (latencies include tracemalloc overhead).
+
+Usage: python benchmarks/sparse_input.py [--rows 1000] [--extra-taxa 20000] [--density 0.01]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.sparse
+
+from _common import SAMPLE_DATA, fit_random_forest, load_sample_data, server
+
+def build_bodies(model_columns, rows, extra_taxa, density, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = list(model_columns) + [f"unclassified_taxon_{i}" for i in range(extra_taxa)]
+    matrix = scipy.sparse.random(rows, len(columns), density=density, format="csr", random_state=seed, dtype=np.float64)
+    matrix.data = np.round(matrix.data * 10, 5)
+
+    order = rng.permutation(len(columns))
+    matrix = matrix[:, order].tocsr()
+    columns = [columns[i] for i in order]
+
+    dense_body = {"dataframe_split": {"columns": columns, "data": matrix.toarray().tolist()}}
+    sparse_body = {"sparse_split": {
+        "columns": columns,
+        "format": "csr",
+        "indptr": matrix.indptr.tolist(),
+        "indices": matrix.indices.tolist(),
+        "data": matrix.data.tolist(),
+    }}
+    return json.dumps(dense_body), json.dumps(sparse_body)
+
+def run(model, model_columns, body):
+    stages = {}
+    tracemalloc.start()
+
+    start = time.perf_counter()
+    input_frame, error = server.read_input_frame(json.loads(body))
+    assert error is None, error
+    stages["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X = server.transformer(input_frame, model_columns)
+    stages["align"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = server.compute_prediction_rows(model, X)
+    stages["predict"] = time.perf_counter() - start
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return stages, peak, predictions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=SAMPLE_DATA)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--extra-taxa", type=int, default=20000)
+    parser.add_argument("--density", type=float, default=0.01)
+    args = parser.parse_args()
+
+    X, y = load_sample_data(args.data)
+    model = fit_random_forest(X, y, n_estimators=200)
+    model_columns = list(X.columns)
+
+    bodies = build_bodies(model_columns, args.rows, args.extra_taxa, args.density)
+    print(f"{args.rows} rows x {len(model_columns) + args.extra_taxa} taxa, density {args.density}")
+    print(f"{'input':<8}{'body_MB':>9}{'parse_s':>9}{'align_s':>9}{'predict_s':>10}{'total_s':>9}{'peak_MB':>9}")
+
+    results = {}
+    for label, body in zip(("dense", "sparse"), bodies):
+        stages, peak, results[label] = run(model, model_columns, body)
+        print(f"{label:<8}{len(body) / 2**20:>9.1f}{stages['parse']:>9.3f}{stages['align']:>9.3f}"
+              f"{stages['predict']:>10.3f}{sum(stages.values()):>9.3f}{peak / 2**20:>9.1f}")
+
+    print("identical predictions:", results["dense"] == results["sparse"])
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,112 @@
-import joblib
-import mlflow
-import shap
-import logging
-
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import pandas as pd
+import time
+module_import_start = time.time()
 
+import logging
 import base64
+import bisect
 from io import BytesIO
+import importlib
 import os
+import re
 import json
+import copy
+import gc
+import multiprocessing
+import fcntl
+import sys
+import hashlib
+import tempfile
+import threading
+import shutil
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Plots render on explicit Agg canvases, this only keeps pyplot (imported by shap) off any GUI backend
+os.environ.setdefault("MPLBACKEND", "Agg")
+# shap's numba kernels are cached here and reused by the next container, see enable_numba_caching
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(os.getenv("ARTIFACT_CACHE_DIR", "/tmp/cache"), "numba"))
+
+# Import time of every module below, for the startup report
+import_times = {}
+
+def timed_import(name):
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = {"seconds": round(time.perf_counter() - start, 3), "lazy": False}
+    return module
+
+class LazyModule:
+    """
+    Stand-in for a heavy module, imported on first attribute access so that routes which
+    never use it (health checks, /v1/mlflow/* metadata) do not pay for the import.
+    on_import runs once on the loaded module. Its own attributes are underscored so
+    they never shadow the module's.
+    """
 
-from flask import Flask, request, jsonify
-from joblib import Memory
-from mlflow.exceptions import MlflowException
-from mlflow.server import get_app_client
+    def __init__(self, name, on_import=None):
+        self._name = name
+        self._on_import = on_import
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                # Modules imported on the way by another one (unpickling a model imports shap) cost ~0 here
+                already_imported = self._name in sys.modules
+                start = time.perf_counter()
+                module = importlib.import_module(self._name)
+                if self._on_import is not None:
+                    self._on_import(module)
+                import_times[self._name] = {
+                    "seconds": round(time.perf_counter() - start, 3),
+                    "lazy": True,
+                    "already_imported": already_imported,
+                    "since_import_start_seconds": round(time.time() - module_import_start, 3),
+                }
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._load()
+        return getattr(module, attr)
+
+def enable_numba_caching(shap_module):
+    """
+    shap compiles its numba kernels without cache=True, so every container start compiled
+    them again. Turn on numba's on-disk cache (NUMBA_CACHE_DIR) for each of them.
+    Kernels taking a JIT function argument (shap's link) still compile once per process.
+    """
+    from numba.core.registry import CPUDispatcher
+
+    for name, module in list(sys.modules.items()):
+        if name == "shap" or name.startswith("shap."):
+            for value in list(vars(module).values()):
+                if isinstance(value, CPUDispatcher):
+                    value.enable_caching()
+
+# Needed by every route, imported at startup
+for module_name in ("numpy", "scipy.sparse", "psutil", "flask"):
+    timed_import(module_name)
+import numpy as np
+import psutil
+import scipy.sparse
+from flask import Flask, request, jsonify, send_file
+
+joblib = LazyModule("joblib")
+mlflow = LazyModule("mlflow")
+mlflow_server = LazyModule("mlflow.server")
+pd = LazyModule("pandas")
+shap = LazyModule("shap", on_import=enable_numba_caching)
+mpl_backend_agg = LazyModule("matplotlib.backends.backend_agg")
+mpl_cm = LazyModule("matplotlib.cm")
+mpl_figure = LazyModule("matplotlib.figure")
+mpl_transforms = LazyModule("matplotlib.transforms")
 
 def safe_jsonify(obj):
     def serialize(v):
@@ -38,36 +128,552 @@ class ShapValueObject:
         self.shap_df = shap_df
         self.explanation = explanation
 
-# Define a persistent disk-based cache directory
+class ShapTensor:
+    """
+    SHAP values of every class for a set of rows: values is (rows, features, classes)
+    and base_values is (classes,). Plots and responses select a class with for_class.
+    """
+
+    def __init__(self, values, base_values, X):
+        self.values = values
+        self.base_values = base_values
+        self.X = X
+
+    @property
+    def n_classes(self):
+        return self.values.shape[2]
+
+    def for_class(self, class_index):
+        explanation = shap.Explanation(self.values[:, :, class_index], data=self.X.values, feature_names=self.X.columns)
+        shap_df = pd.DataFrame(self.values[:, :, class_index], columns=self.X.columns, index=self.X.index)
+        return ShapValueObject(self.base_values[class_index], shap_df, explanation)
+
+class ArtifactStore:
+    """
+    Size-bounded, content-addressed on-disk cache for deserialized MLflow artifacts.
+
+    Each artifact is serialized once with joblib and stored under the sha256 of that
+    file in objects/, with a small ref in refs/ mapping (run_id, artifact_path) to
+    the checksum. Files are written to a temp path and renamed into place, and a
+    per-key file lock stops concurrent workers from downloading the same artifact
+    twice. Once the store grows past max_bytes, the least recently used objects
+    (by mtime, refreshed on every hit) are deleted.
+
+    Plain numpy arrays are loaded read-only memory-mapped, so worker processes on
+    the pod share their physical pages instead of holding a private copy. That
+    covers the explainer background data and the tree arrays of a logged
+    TreeExplainer, but not sklearn models: Tree.__setstate__ copies the node
+    arrays into private memory, so every worker holds its own copy of the trees.
+    """
+
+    def __init__(self, location, max_bytes):
+        self.location = location
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        for subdir in ("objects", "refs", "locks"):
+            os.makedirs(os.path.join(location, subdir), exist_ok=True)
+
+    def get_or_create(self, run_id, artifact_path, build):
+        key = hashlib.sha256(f"{run_id}/{artifact_path}".encode("utf-8")).hexdigest()
+        value = self._load(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        with open(os.path.join(self.location, "locks", key), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another worker may have stored it while we were waiting for the lock
+            value = self._load(key)
+            if value is not None:
+                self._count("hits")
+                return value
+
+            self._count("misses")
+            checksum = self._store(key, run_id, artifact_path, build())
+            value = self._load(key)
+
+        self._evict_over_budget(keep=checksum)
+        return value
+
+    def _object_path(self, checksum):
+        return os.path.join(self.location, "objects", f"{checksum}.joblib")
+
+    def _ref_path(self, key):
+        return os.path.join(self.location, "refs", f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._ref_path(key), "r") as f:
+                object_path = self._object_path(json.load(f)["checksum"])
+            value = joblib.load(object_path, mmap_mode="r")
+            os.utime(object_path)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        return value
+
+    def _store(self, key, run_id, artifact_path, value):
+        objects_dir = os.path.join(self.location, "objects")
+        fd, tmp_path = tempfile.mkstemp(dir=objects_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            joblib.dump(value, tmp_path)
+            sha256 = hashlib.sha256()
+            with open(tmp_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            checksum = sha256.hexdigest()
+            os.replace(tmp_path, self._object_path(checksum))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        ref = {"run_id": run_id, "artifact_path": artifact_path, "checksum": checksum}
+        fd, tmp_ref_path = tempfile.mkstemp(dir=os.path.join(self.location, "refs"), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(ref, f)
+        os.replace(tmp_ref_path, self._ref_path(key))
+        return checksum
+
+    def _list_objects(self):
+        objects_dir = os.path.join(self.location, "objects")
+        objects = []
+        for entry in os.scandir(objects_dir):
+            if not entry.name.endswith(".joblib"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, entry.path))
+        return objects
+
+    def _evict_over_budget(self, keep):
+        objects = sorted(self._list_objects())
+        total_bytes = sum(size for _, size, _ in objects)
+        keep_path = self._object_path(keep)
+        evicted = set()
+        for _, size, path in objects:
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            total_bytes -= size
+            evicted.add(os.path.basename(path)[:-len(".joblib")])
+            try:
+                # Processes that already mapped this file keep their pages until they drop it
+                os.remove(path)
+            except FileNotFoundError:
+                continue  # evicted by another worker
+            self._count("evictions")
+            logger.info(f"♻️ Evicted {os.path.basename(path)} from artifact cache")
+        if evicted:
+            self._remove_refs(evicted)
+
+    def _remove_refs(self, checksums):
+        """Delete the refs pointing at the given objects, and their lock files."""
+        for entry in os.scandir(os.path.join(self.location, "refs")):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    checksum = json.load(f)["checksum"]
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            if checksum not in checksums:
+                continue
+            key = entry.name[:-len(".json")]
+            for path in (entry.path, os.path.join(self.location, "locks", key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # removed by another worker
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        objects = self._list_objects()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "objects": len(objects),
+                "bytes_used": sum(size for _, size, _ in objects),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
 # Flask API is running inside KServe in Kubernetes, each API call may run in a new process, causing MLflow downloads to be re-triggered.
-# Solution: Use disk-based caching (joblib.Memory) to persist downloaded files across requests.
-memory = Memory(location="/tmp/cache", verbose=0)
-@memory.cache
+# Solution: Keep deserialized artifacts in a bounded on-disk store shared by every process on the pod.
+artifact_store = ArtifactStore(
+    location=os.getenv("ARTIFACT_CACHE_DIR", "/tmp/cache"),
+    max_bytes=int(os.getenv("ARTIFACT_CACHE_MAX_MB", "1024")) * 1024 * 1024
+)
+
 def load_input_columns_cached(run_id, artifact_path):
-    input_example_path = mlflow.artifacts.download_artifacts(artifact_path=artifact_path, run_id=run_id)
-    with open(input_example_path, "r") as f:
-        input_example = json.load(f)
-    return input_example["columns"]
+    def download():
+        with tempfile.TemporaryDirectory() as dst_path:
+            input_example_path = mlflow.artifacts.download_artifacts(artifact_path=artifact_path, run_id=run_id, dst_path=dst_path)
+            with open(input_example_path, "r") as f:
+                input_example = json.load(f)
+        return input_example["columns"]
+
+    return artifact_store.get_or_create(run_id, artifact_path, download)
 
-@memory.cache
 def load_explainer_cached(run_id, artifact_path):
-    explainer_path = mlflow.artifacts.download_artifacts(artifact_path=artifact_path, run_id=run_id)
-    with open(explainer_path, "rb") as f:
-        explainer = joblib.load(f)
-    return explainer
+    def download():
+        with tempfile.TemporaryDirectory() as dst_path:
+            explainer_path = mlflow.artifacts.download_artifacts(artifact_path=artifact_path, run_id=run_id, dst_path=dst_path)
+            with open(explainer_path, "rb") as f:
+                explainer = joblib.load(f)
+        return explainer
 
-@memory.cache
-def load_model_cached(model_name):
+    return artifact_store.get_or_create(run_id, artifact_path, download)
+
+def get_production_version(model_name):
     client = mlflow.tracking.MlflowClient()
     model_versions = client.get_latest_versions(model_name, stages=["Production"])
     if not model_versions:
         raise ValueError(f"No model version for '{model_name}' in Production stage.")
     model_version_info = model_versions[-1]
-    version = model_version_info.version
-    run_id = model_version_info.run_id
-    model_uri = f"models:/{model_name}/{version}"
-    model = mlflow.sklearn.load_model(model_uri)
-    return model, run_id
+    return model_version_info.version, model_version_info.run_id
+
+def load_model_cached(model_name, version, run_id):
+    def download():
+        with tempfile.TemporaryDirectory() as dst_path:
+            model_uri = f"models:/{model_name}/{version}"
+            model = mlflow.sklearn.load_model(model_uri, dst_path=dst_path)
+        return model
+
+    return artifact_store.get_or_create(run_id, "model", download)
+
+class LoadedModel:
+    def __init__(self, model_name, version, run_id, model, input_columns, explainer):
+        self.model_name = model_name
+        self.version = version
+        self.run_id = run_id
+        self.model = model
+        self.input_columns = input_columns
+        self.explainer = explainer
+        self.load_seconds = {}
+        self._tree_explainers = OrderedDict()  # tree count -> path-dependent explainer, None when unsupported
+        self._lock = threading.Lock()
+
+    def get_tree_explainer(self, tree_fraction=1.0):
+        # Keyed on the trees actually kept, so fractions that select the same subset share one explainer
+        key = get_tree_count(self.model, tree_fraction)
+        with self._lock:
+            if key in self._tree_explainers:
+                self._tree_explainers.move_to_end(key)
+            else:
+                self._tree_explainers[key] = build_fast_explainer(subsample_trees(self.model, tree_fraction))
+                while len(self._tree_explainers) > TREE_EXPLAINER_CACHE_SIZE:
+                    self._tree_explainers.popitem(last=False)
+            return self._tree_explainers[key]
+
+def get_process_rss():
+    return psutil.Process(os.getpid()).memory_info().rss
+
+class ModelRegistry:
+    """
+    Process-resident registry of deserialized models, explainers and input columns.
+
+    Entries are keyed by (model_name, version, run_id) so a request only pays for
+    unpickling on the first load of a version. When the process RSS exceeds
+    max_rss_bytes, least-recently-used entries are evicted (the entry just loaded
+    is always kept).
+    """
+
+    def __init__(self, max_rss_bytes):
+        self.max_rss_bytes = max_rss_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given key, the others wait and reuse its result
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry
+                self.misses += 1
+
+            try:
+                entry = loader()
+                with self._lock:
+                    self._entries[key] = entry
+                    self._evict_over_budget()
+            finally:
+                # Also on failure, so a model that fails to load does not leave its lock behind
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return entry
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def _evict_over_budget(self):
+        while len(self._entries) > 1 and get_process_rss() > self.max_rss_bytes:
+            key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            gc.collect()
+            logger.info(f"♻️ Evicted {key} from model registry")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": [
+                    {
+                        "model_name": name,
+                        "version": version,
+                        "run_id": run_id,
+                        "load_seconds": entry.load_seconds,
+                    }
+                    for (name, version, run_id), entry in self._entries.items()
+                ],
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "rss_bytes": get_process_rss(),
+                "max_rss_bytes": self.max_rss_bytes,
+            }
+
+# Pod memory limit is 2 GiB, leave headroom for request processing and plotting
+model_registry = ModelRegistry(max_rss_bytes=int(os.getenv("MODEL_REGISTRY_MAX_RSS_MB", "1536")) * 1024 * 1024)
+
+# From most to least accurate: "interventional" uses the explainer logged with the run (exact
+# interventional SHAP against its background data), "fast" uses tree-path-dependent TreeSHAP
+# computed from the model alone, "approximate" uses Saabas-style per-path attribution over the
+# same trees. SHAP_MODE is the default, requests can pick another mode with "shap_mode".
+# Path-dependent TreeSHAP weighs features by the training cover of each tree node instead of
+# the background, so "fast" values are locally accurate but not numerically equal to the
+# interventional ones (benchmarks/fast_shap_fidelity.py bounds the gap on the sample models).
+SHAP_MODES = ("interventional", "fast", "approximate")
+# Reported with every explanation so callers can tell which values they got
+SHAP_MODE_PERTURBATION = {"interventional": "interventional", "fast": "tree_path_dependent", "approximate": "saabas"}
+SHAP_MODE = os.getenv("SHAP_MODE", "interventional")
+if SHAP_MODE not in SHAP_MODES:
+    raise ValueError(f"Environment variable 'SHAP_MODE' must be one of {list(SHAP_MODES)}.")
+# Path-dependent explainers kept per model version, one per tree subset requested
+TREE_EXPLAINER_CACHE_SIZE = int(os.getenv("TREE_EXPLAINER_CACHE_SIZE", "4"))
+
+class XGBoostContribExplainer:
+    """
+    Tree-path-dependent SHAP values from XGBoost's native pred_contribs output,
+    in the same log-odds space as shap's TreeExplainer for XGBoost classifiers.
+    """
+
+    def __init__(self, model):
+        self.booster = model.get_booster()
+        contribs = self._predict_contribs(np.zeros((1, self.booster.num_features())))
+        # The bias column is the same for every row
+        self.expected_value = contribs[0, :, -1] if contribs.ndim == 3 else float(contribs[0, -1])
+
+    def _predict_contribs(self, X, approximate=False):
+        import xgboost
+
+        dmatrix = xgboost.DMatrix(X, feature_names=self.booster.feature_names)
+        return self.booster.predict(dmatrix, pred_contribs=True, approx_contribs=approximate)
+
+    def shap_values(self, X, approximate=False):
+        contribs = self._predict_contribs(np.asarray(X, dtype=np.float64), approximate)
+        if contribs.ndim == 3:  # Multiclass: (rows, classes, features + 1)
+            return np.transpose(contribs[:, :, :-1], (0, 2, 1))
+        return contribs[:, :-1]
+
+def supports_tree_subsampling(model):
+    # Averaging ensembles (RandomForest, ExtraTrees) keep their trees in a list, boosting
+    # stages (GradientBoosting arrays, XGBoost) cannot be dropped without changing the output
+    return isinstance(getattr(model, "estimators_", None), list)
+
+def get_tree_count(model, tree_fraction):
+    """Number of trees subsample_trees keeps for tree_fraction, None for models it leaves whole."""
+    if not supports_tree_subsampling(model):
+        return None
+    n_estimators = len(model.estimators_)
+    return n_estimators if tree_fraction >= 1.0 else max(1, int(round(n_estimators * tree_fraction)))
+
+def subsample_trees(model, tree_fraction):
+    """
+    Shallow copy of an averaging ensemble restricted to an evenly spaced fraction of
+    its trees. Other models, or tree_fraction 1.0, are returned unchanged.
+    """
+    n_trees = get_tree_count(model, tree_fraction)
+    if n_trees is None or n_trees == len(model.estimators_):
+        return model
+    estimators = model.estimators_
+    subsampled = copy.copy(model)
+    subsampled.estimators_ = [estimators[i] for i in np.linspace(0, len(estimators) - 1, n_trees).astype(int)]
+    subsampled.n_estimators = n_trees
+    return subsampled
+
+def build_fast_explainer(model):
+    """
+    Build a tree-path-dependent explainer for tree ensembles (RandomForest,
+    GradientBoosting, XGBoost). Returns None for models TreeSHAP does not support.
+    """
+    if type(model).__module__.startswith("xgboost"):
+        return XGBoostContribExplainer(model)
+    try:
+        return shap.TreeExplainer(model, feature_perturbation="tree_path_dependent")
+    except Exception as e:
+        logger.info(f"⚠️ No fast TreeSHAP path for {type(model).__name__}: {e}")
+        return None
+
+# Artifacts of a model version are fetched concurrently, so a cold load costs roughly the slowest artifact
+def new_artifact_fetch_pool():
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("ARTIFACT_FETCH_WORKERS", "4")),
+        thread_name_prefix="artifact-fetch"
+    )
+
+artifact_fetch_pool = new_artifact_fetch_pool()
+
+def timed_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, round(time.perf_counter() - start, 3)
+
+def load_model_version(model_name, version, run_id):
+    model_future = artifact_fetch_pool.submit(
+        timed_call, load_model_cached, model_name, version, run_id
+    )
+    input_columns_future = artifact_fetch_pool.submit(
+        timed_call, load_input_columns_cached, run_id, "model/input_example.json"
+    )
+    explainer_future = artifact_fetch_pool.submit(
+        timed_call, load_explainer_cached, run_id, "shap_explainer/shap_explainer.pkl"
+    )
+    load_seconds = {}
+
+    try:
+        input_columns, load_seconds["input_columns"] = input_columns_future.result()
+        logger.info(f"✅ Loaded input columns from cache: {input_columns[:5]} ... (total {len(input_columns)} features)")
+    except Exception as e:
+        logger.error(f"❌ Failed to load input columns: {e}")
+        input_columns = None
+
+    try:
+        explainer, load_seconds["explainer"] = explainer_future.result()
+        logger.info(f"✅ Loaded SHAP Explainer from cache for run_id {run_id}")
+    except Exception as e:
+        logger.error(f"❌ Failed to load explainer: {e}")
+        explainer = None
+
+    model, load_seconds["model"] = model_future.result()
+    logger.info(f"✅ Loaded model from cache for model: {model_name} version {version} ({load_seconds})")
+
+    loaded = LoadedModel(model_name, version, run_id, model, input_columns, explainer)
+    if SHAP_MODE != "interventional":
+        loaded.get_tree_explainer()
+    loaded.load_seconds = load_seconds
+    return loaded
+
+class ProductionVersionResolver:
+    """
+    Resolves the Production version of each model with a short TTL.
+
+    Only the first request for a model waits on the MLflow registry. Once the TTL
+    expires, requests keep being served by the current version while a background
+    thread looks up the registry again. When a new version was promoted, it is
+    loaded into the model registry first and only then swapped in, so promotions
+    never cause a cold load on the request path.
+    """
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._versions = {}  # model_name -> (version, run_id, resolved_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def resolve(self, model_name):
+        with self._lock:
+            current = self._versions.get(model_name)
+            if current is not None:
+                version, run_id, resolved_at = current
+                if time.monotonic() - resolved_at >= self.ttl_seconds:
+                    self._refresh_in_background(model_name)
+                return version, run_id
+
+        version, run_id = get_production_version(model_name)
+        with self._lock:
+            version, run_id, _ = self._versions.setdefault(model_name, (version, run_id, time.monotonic()))
+        return version, run_id
+
+    def refresh(self, model_name):
+        with self._lock:
+            if model_name in self._versions:
+                self._refresh_in_background(model_name)
+
+    def _refresh_in_background(self, model_name):
+        # Caller must hold self._lock
+        if model_name in self._refreshing:
+            return
+        self._refreshing.add(model_name)
+        threading.Thread(target=self._refresh, args=(model_name,), daemon=True).start()
+
+    def _refresh(self, model_name):
+        try:
+            current_version, current_run_id, _ = self._versions[model_name]
+            try:
+                version, run_id = get_production_version(model_name)
+            except Exception as e:
+                # Keep serving the current version, retry after the next TTL
+                logger.error(f"❌ Failed to resolve Production version for {model_name}: {e}")
+                version, run_id = current_version, current_run_id
+
+            if (version, run_id) != (current_version, current_run_id):
+                logger.info(f"🔄 Warming up {model_name} version {version} before swapping from version {current_version}")
+                model_registry.get_or_load(
+                    (model_name, version, run_id),
+                    lambda: load_model_version(model_name, version, run_id)
+                )
+
+            with self._lock:
+                self._versions[model_name] = (version, run_id, time.monotonic())
+
+            if version != current_version:
+                logger.info(f"✅ Swapped {model_name} to Production version {version}")
+        except Exception as e:
+            logger.error(f"❌ Failed to load new Production version for {model_name}: {e}")
+            with self._lock:
+                current_version, current_run_id, _ = self._versions[model_name]
+                self._versions[model_name] = (current_version, current_run_id, time.monotonic())
+        finally:
+            with self._lock:
+                self._refreshing.discard(model_name)
+
+    def versions(self):
+        with self._lock:
+            return {
+                model_name: {"version": version, "run_id": run_id}
+                for model_name, (version, run_id, _) in self._versions.items()
+            }
+
+production_resolver = ProductionVersionResolver(ttl_seconds=float(os.getenv("PRODUCTION_VERSION_TTL_SECONDS", "30")))
 
 class ModelLoader:
     def __init__(self, model_name):
@@ -80,153 +686,1457 @@ class ModelLoader:
         mlflow.set_tracking_uri(self.mlflow_url)
 
     def load(self):
-        model, run_id = load_model_cached(self.model_name)
-        logger.info(f"✅ Loaded model from cache for model: {self.model_name}")
+        version, run_id = production_resolver.resolve(self.model_name)
+        self.version, self.run_id = version, run_id
+        loaded = model_registry.get_or_load(
+            (self.model_name, version, run_id),
+            lambda: load_model_version(self.model_name, version, run_id)
+        )
+        self.loaded = loaded
+        return loaded.model, loaded.input_columns, self.get_explainer()
+
+    def get_explainer(self, shap_mode=None, tree_fraction=1.0):
+        """
+        Select the explainer for a SHAP mode (default SHAP_MODE) and record the mode and
+        tree fraction actually used in self.shap_mode / self.tree_fraction. The fraction is
+        that of the trees subsample_trees keeps, so every request for the same subset shares
+        the row and plot cache keys. Models without a TreeSHAP path fall back to the logged
+        explainer.
+        """
+        shap_mode = shap_mode or SHAP_MODE
+        n_trees = get_tree_count(self.loaded.model, tree_fraction)
+        tree_fraction = 1.0 if n_trees is None else n_trees / len(self.loaded.model.estimators_)
+
+        explainer = None
+        if shap_mode != "interventional":
+            explainer = self.loaded.get_tree_explainer(tree_fraction)
+        if explainer is None:
+            shap_mode, tree_fraction, explainer = "interventional", 1.0, self.loaded.explainer
+
+        self.shap_mode, self.tree_fraction = shap_mode, tree_fraction
+        return explainer
+
+class RowCache:
+    """
+    LRU cache of per-row results (SHAP vectors, predictions) keyed by
+    (kind, model run_id, row hash), bounded by the bytes of the cached values.
+    """
 
-        try:
-            input_columns = load_input_columns_cached(run_id, "model/input_example.json")
-            logger.info(f"✅ Loaded input columns from cache: {input_columns[:5]} ... (total {len(input_columns)} features)")
-        except Exception as e:
-            logger.error(f"❌ Failed to load input columns: {e}")
-            input_columns = None
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _sizeof(self, value):
+        return sum(getattr(item, "nbytes", 8) for item in value) + 64
+
+    def put(self, key, value):
+        nbytes = self._sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes_used -= previous[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes_used += nbytes
+            while self.bytes_used > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self.bytes_used -= evicted_nbytes
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes_used": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
 
-        try:
-            explainer = load_explainer_cached(run_id, "shap_explainer/shap_explainer.pkl")
-            logger.info(f"✅ Loaded SHAP Explainer from cache for run_id {run_id}")
-        except Exception as e:
-            logger.error(f"❌ Failed to load explainer: {e}")
-            explainer = None
+row_cache = RowCache(max_bytes=int(os.getenv("ROW_CACHE_MAX_MB", "128")) * 1024 * 1024)
+
+def hash_rows(X):
+    # Rows are hashed after alignment, so the same sample hashes the same whatever the upload layout
+    columns_digest = hashlib.blake2b("\x1f".join(map(str, X.columns)).encode("utf-8"), digest_size=8).digest()
+    if isinstance(X, SparseFrame):
+        # Densify one row at a time so sparse and dense uploads of a sample share cache entries
+        row = np.zeros(len(X.columns), dtype=np.float64)
+        hashes = []
+        for start, end in zip(X.matrix.indptr[:-1], X.matrix.indptr[1:]):
+            row[X.matrix.indices[start:end]] = X.matrix.data[start:end]
+            hashes.append(hashlib.blake2b(row.tobytes(), digest_size=16, key=columns_digest).digest())
+            row[X.matrix.indices[start:end]] = 0.0
+        return hashes
+    values = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+    return [hashlib.blake2b(row.tobytes(), digest_size=16, key=columns_digest).digest() for row in values]
+
+def get_rows_cached(kind, run_id, X, compute):
+    """
+    Return one result per row of X, computing only rows missing from row_cache.
+    compute(X_subset) must return a list with one tuple of values per row.
+    Without a run_id the rows cannot be keyed to a model version, so nothing is cached.
+    """
+    if run_id is None:
+        return compute(X)
 
-        return model, input_columns, explainer
+    keys = [(kind, run_id, row_hash) for row_hash in hash_rows(X)]
+    results = [row_cache.get(key) for key in keys]
+
+    # Identical rows within a batch are computed once
+    missing = {}
+    for position, (key, result) in enumerate(zip(keys, results)):
+        if result is None:
+            missing.setdefault(key, []).append(position)
+
+    if missing:
+        first_positions = [positions[0] for positions in missing.values()]
+        computed = compute(X.take(first_positions))
+        for (key, positions), result in zip(missing.items(), computed):
+            row_cache.put(key, result)
+            for position in positions:
+                results[position] = result
+
+    return results
+
+def compute_shap_rows(explainer, X, approximate=False):
+    """
+    Returns one (values, base_values) pair per row, values being (features, classes)
+    so every class is computed and cached once.
+    """
+    shap_values = explainer.shap_values(X, approximate=True) if approximate else explainer.shap_values(X)
 
-# Shap function
-def get_shap_value(explainer, X):
-    shap_values = explainer.shap_values(X)
-    
     if len(shap_values.shape) == 3: # Multiclass Classification
-        shap_values_class = shap_values[:, :, 1]
-        base_value = explainer.expected_value[1]
+        base_values = np.ravel(explainer.expected_value)
     elif len(shap_values.shape) == 2: # Binary Classification
-        shap_values_class = shap_values
-        base_value = explainer.expected_value
+        # Single-output explainers explain the positive class in margin space,
+        # where the negative class is its mirror image.
+        # Some explainers (e.g. path-dependent GradientBoosting) report a one-element array
+        base_value = np.ravel(explainer.expected_value)[0]
+        shap_values = np.stack([-shap_values, shap_values], axis=-1)
+        base_values = np.array([-base_value, base_value])
     else:
         raise ValueError(f"Unsupported SHAP values shape: {shap_values.shape}")
 
-    feature_names = X.columns
-    patient_ids = X.index
+    return [(row, base_values) for row in shap_values]
 
-    explanation = shap.Explanation(shap_values_class, data=X.values, feature_names=feature_names)
-    shap_df = pd.DataFrame(shap_values_class, columns=feature_names, index=patient_ids)
+def compute_shap_chunk(model_key, shap_mode, tree_fraction, X):
+    """
+    Process-pool task: compute SHAP rows for one chunk. Each worker keeps its own
+    model registry, loaded from the shared on-disk artifact store.
+    """
+    loaded = model_registry.get_or_load(model_key, lambda: load_model_version(*model_key))
+    if shap_mode == "interventional":
+        explainer = loaded.explainer
+    else:
+        explainer = loaded.get_tree_explainer(tree_fraction)
+    return compute_shap_rows(explainer, X, approximate=shap_mode == "approximate")
 
-    return ShapValueObject(base_value, shap_df, explanation)
+def init_shap_worker():
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_URL", None))
 
-def get_beeswarm(explanation):
-        plt.ioff()
-        plt.figure()
-        shap.plots.beeswarm(explanation, max_display=15)
-        ax = plt.gca()
-        
-        x_min, x_max = ax.get_xlim()
-        x_range = x_max - x_min
+class ShapProcessPool:
+    """
+    Splits large batches into row chunks and computes SHAP values on a persistent
+    pool of worker processes, reassembling the rows in order. Batches smaller than
+    min_rows, or every batch when workers is 0, are computed in-process.
+    """
 
-        yticks = ax.get_yticks()
-        yticklabels = [label.get_text() for label in ax.get_yticklabels()]
+    def __init__(self, workers, chunk_rows, min_rows):
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.min_rows = min_rows
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: the server process already runs threads, which fork does not handle safely
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_shap_worker
+                )
+            return self._executor
 
-        ax.set_yticks([])
-        ax.set_yticklabels([])
-        feature_position = x_min - 0.030 * x_range
+    def compute(self, explainer, X, model_key, shap_mode, tree_fraction):
+        approximate = shap_mode == "approximate"
+        if self.workers <= 0 or model_key is None or len(X) < self.min_rows:
+            return compute_shap_rows(explainer, X, approximate)
 
-        for i, (y, label) in enumerate(zip(yticks, yticklabels)):
-            ax.text(
-                feature_position,
-                y,
-                label.replace("_", " "),
-                fontsize=12,
-                fontstyle="italic" if i not in (0, len(yticklabels) - 1) else "normal",
-                verticalalignment="center",
-                horizontalalignment="right"
-            )
+        executor = self._get_executor()
+        try:
+            futures = [
+                executor.submit(compute_shap_chunk, model_key, shap_mode, tree_fraction, X.iloc[start:start + self.chunk_rows])
+                for start in range(0, len(X), self.chunk_rows)
+            ]
+            rows = []
+            for future in futures:
+                rows.extend(future.result())
+            return rows
+        except BrokenProcessPool as e:
+            logger.error(f"❌ SHAP process pool failed, computing in-process: {e}")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            return compute_shap_rows(explainer, X, approximate)
+
+    def warm(self, model_key, shap_mode, tree_fraction, X):
+        """Start the workers and load the model into them ahead of traffic."""
+        if self.workers <= 0:
+            return
+        executor = self._get_executor()
+        futures = [executor.submit(compute_shap_chunk, model_key, shap_mode, tree_fraction, X) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        """Stop the workers, the next large batch starts a new pool."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+shap_pool = ShapProcessPool(
+    workers=int(os.getenv("SHAP_POOL_WORKERS", "0")),
+    chunk_rows=int(os.getenv("SHAP_CHUNK_ROWS", "128")),
+    min_rows=int(os.getenv("SHAP_POOL_MIN_ROWS", "256"))
+)
 
-        plt.tight_layout()    
-        img_buf = BytesIO()
-        plt.savefig(img_buf, format='png', bbox_inches='tight')
-        img_buf.seek(0)
+# Shap function
+def get_shap_tensor(explainer, X, model_loader=None):
+    # SHAP explainers and plots need dense features
+    if model_loader is None:
+        rows = compute_shap_rows(explainer, to_dense(X))
+    else:
+        model_key = (model_loader.model_name, model_loader.version, model_loader.run_id)
+        shap_mode, tree_fraction = model_loader.shap_mode, model_loader.tree_fraction
+        rows = get_rows_cached(
+            f"shap:{shap_mode}:{tree_fraction}",
+            model_loader.run_id,
+            X,
+            lambda X_missing: shap_pool.compute(explainer, to_dense(X_missing), model_key, shap_mode, tree_fraction)
+        )
+    return ShapTensor(np.stack([row for row, _ in rows]), rows[0][1], to_dense(X))
 
-        # Convert the BytesIO object to base64
-        img_base64 = base64.b64encode(img_buf.read()).decode("utf-8")
-        plt.close()
-        return img_base64
-    
-def get_heatmap(explanation): 
-    shap.plots.heatmap(explanation, instance_order=explanation.sum(1), max_display=15, show=False)
+def get_shap_value(explainer, X, model_loader=None, class_index=1):
+    return get_shap_tensor(explainer, X, model_loader).for_class(class_index)
 
-    plt.ioff()
+def explain_classes(shap_tensor, class_index, render):
+    """
+    Apply render to the ShapValueObject of class_index, or of every class keyed by
+    class index when class_index is "all".
+    """
+    if class_index == "all":
+        return {str(index): render(shap_tensor.for_class(index)) for index in range(shap_tensor.n_classes)}
+    return render(shap_tensor.for_class(class_index))
+
+# Plot rendering: every plot draws on its own Figure with an Agg canvas and never touches
+# pyplot's global current figure, so plots can be rendered concurrently from several threads.
+# Labels avoid mathtext ($...$), whose shared parser is not thread-safe; italics stand in for it.
+def new_figure(figsize=None):
+    fig = mpl_figure.Figure(figsize=figsize)
+    mpl_backend_agg.FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+def figure_to_png(fig, **savefig_kwargs):
+    img_buf = BytesIO()
+    fig.savefig(img_buf, format="png", **savefig_kwargs)
+    return img_buf.getvalue()
+
+def encode_png(raw):
+    return base64.b64encode(raw).decode("utf-8")
 
-    ax = plt.gca()
+def draw_feature_labels(ax, feature_position, normal_labels=None):
+    """
+    Replace the y tick labels with right-aligned text at feature_position, underscores
+    shown as spaces and taxa in italics. Labels at the positions in normal_labels
+    (negative from the end, default the first and last) are upright.
+    """
     yticks = ax.get_yticks()
     yticklabels = [label.get_text() for label in ax.get_yticklabels()]
+    normal_labels = {index % len(yticklabels) for index in (normal_labels or (0, -1))}
+
     ax.set_yticks([])
     ax.set_yticklabels([])
 
     for i, (y, label) in enumerate(zip(yticks, yticklabels)):
         ax.text(
-            -1,
+            feature_position,
             y,
             label.replace("_", " "),
             fontsize=12,
-            fontstyle="italic" if i not in (0, len(yticklabels) - 1) else "normal",
+            fontstyle="normal" if i in normal_labels else "italic",
             verticalalignment="center",
             horizontalalignment="right"
         )
 
-    img_buf = BytesIO()
-    plt.savefig(img_buf, format='png', bbox_inches='tight')
-    img_buf.seek(0)
+def order_by_importance(importance):
+    """
+    Positions by decreasing importance, ties kept in feature order. Every plot and its
+    data payload order features with it, so they list tied features the same way.
+    """
+    return np.argsort(-np.asarray(importance), kind="stable")
+
+def sample_beeswarm_points(shaps, max_points, rng):
+    """
+    Positions of about max_points of shaps, sampled from each of the 100 SHAP value bins
+    the beeswarm stacks dots in, in proportion to the bin's count. Every non-empty bin
+    keeps at least one dot, so the outliers in the tails stay visible.
+    """
+    quant = np.round(100 * (shaps - np.min(shaps)) / (np.max(shaps) - np.min(shaps) + 1e-8)).astype(np.intp)
+    quota = np.maximum(1, np.bincount(quant) * max_points // len(shaps))
+
+    # Sort by bin, randomly within a bin, and keep each bin's first quota dots
+    order = np.lexsort((rng.random(len(shaps)), quant))
+    sorted_bins = quant[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_bins, sorted_bins)
+    return rng.permutation(order[rank < quota[sorted_bins]])
+
+def draw_beeswarm(ax, explanation, max_display=10, cmap=None, seed=0, max_points=None):
+    """
+    shap.plots.beeswarm drawn on an explicit Axes, features ordered by mean absolute
+    SHAP value. The dot jitter uses its own seeded generator instead of NumPy's global
+    random state, so the same explanation always renders the same image. With max_points,
+    rows with more dots draw a stratified sample of them (see sample_beeswarm_points).
+    """
+    cmap = cmap or shap.plots.colors.red_blue
+    rng = np.random.default_rng(seed)
+    values = np.copy(explanation.values)
+    features = np.asarray(explanation.data, dtype=np.float64)
+    feature_names = list(explanation.feature_names)
+
+    feature_order = order_by_importance(np.abs(values).mean(0))
+    num_features = min(max_display, len(feature_names))
+    feature_inds = feature_order[:num_features]
+    yticklabels = [feature_names[i] for i in feature_inds]
+
+    # Group the features beyond max_display into the last row
+    if num_features < values.shape[1]:
+        values[:, feature_order[num_features - 1]] = values[:, feature_order[num_features - 1:]].sum(1)
+        yticklabels[-1] = f"Sum of {values.shape[1] - num_features + 1} other features"
+
+    row_height = 0.4
+    ax.axvline(x=0, color="#999999", zorder=-1)
+
+    for pos, i in enumerate(reversed(feature_inds)):
+        ax.axhline(y=pos, color="#cccccc", lw=0.5, dashes=(1, 5), zorder=-1)
+        if max_points is not None and len(values) > max_points:
+            f_inds = sample_beeswarm_points(values[:, i], max_points, rng)
+        else:
+            f_inds = rng.permutation(len(values))
+        shaps = values[f_inds, i]
+        fvalues = features[f_inds, i]
+
+        # Stack dots that fall into the same of 100 bins alternately above and below the row
+        quant = np.round(100 * (shaps - np.min(shaps)) / (np.max(shaps) - np.min(shaps) + 1e-8))
+        layer = 0
+        last_bin = -1
+        ys = np.zeros(len(shaps))
+        for ind in np.argsort(quant + rng.standard_normal(len(shaps)) * 1e-6):
+            if quant[ind] != last_bin:
+                layer = 0
+            ys[ind] = np.ceil(layer / 2) * ((layer % 2) * 2 - 1)
+            layer += 1
+            last_bin = quant[ind]
+        ys *= 0.9 * (row_height / np.max(ys + 1))
+
+        # Color by the feature value trimmed to its 5-95th percentile, without collapsing the range,
+        # of every row even when only a sample is drawn
+        all_fvalues = features[:, i]
+        vmin, vmax = np.nanpercentile(all_fvalues, 5), np.nanpercentile(all_fvalues, 95)
+        if vmin == vmax:
+            vmin, vmax = np.nanpercentile(all_fvalues, 1), np.nanpercentile(all_fvalues, 99)
+            if vmin == vmax:
+                vmin, vmax = np.min(all_fvalues), np.max(all_fvalues)
+        vmin = min(vmin, vmax)
+
+        nan_mask = np.isnan(fvalues)
+        ax.scatter(
+            shaps[nan_mask], pos + ys[nan_mask],
+            color="#777777", s=16, linewidth=0, zorder=3, rasterized=len(shaps) > 500,
+        )
+        cvals = np.clip(fvalues[~nan_mask], vmin, vmax)
+        ax.scatter(
+            shaps[~nan_mask], pos + ys[~nan_mask],
+            cmap=cmap, vmin=vmin, vmax=vmax, c=cvals, s=16, linewidth=0, zorder=3, rasterized=len(shaps) > 500,
+        )
+
+    mappable = mpl_cm.ScalarMappable(cmap=cmap)
+    mappable.set_array([0, 1])
+    cb = ax.get_figure().colorbar(mappable, ax=ax, ticks=[0, 1], aspect=80)
+    cb.set_ticklabels(["Low", "High"])
+    cb.set_label("Feature value", size=12, labelpad=0)
+    cb.ax.tick_params(labelsize=11, length=0)
+    cb.set_alpha(1)
+    cb.outline.set_visible(False)
+
+    axis_color = "#333333"
+    ax.xaxis.set_ticks_position("bottom")
+    ax.yaxis.set_ticks_position("none")
+    ax.spines[["right", "top", "left"]].set_visible(False)
+    ax.tick_params(color=axis_color, labelcolor=axis_color)
+    ax.set_yticks(range(len(feature_inds)), list(reversed(yticklabels)), fontsize=13)
+    ax.tick_params("y", length=20, width=0.5, which="major")
+    ax.tick_params("x", labelsize=11)
+    ax.set_ylim(-1, len(feature_inds))
+    ax.set_xlabel("SHAP value (impact on model output)", fontsize=13)
+
+def draw_heatmap(ax, explanation, max_display=10, cmap=None, max_columns=None):
+    """
+    shap.plots.heatmap drawn on an explicit Axes: instances ordered by their summed
+    SHAP values, features by mean absolute SHAP value. With max_columns, more instances
+    are drawn as max_columns columns, each the mean of a run of neighbouring instances
+    in that order, on the same instance axis.
+    """
+    cmap = cmap or shap.plots.colors.red_white_blue
+    values = explanation.values
+    feature_values = np.abs(values).mean(0)
+    feature_order = order_by_importance(feature_values)
+    instance_order = np.argsort(values.sum(1))[::-1]
+
+    feature_names = np.array(explanation.feature_names)[feature_order]
+    values = values[instance_order][:, feature_order]
+    feature_values = feature_values[feature_order]
+
+    # Group the features beyond max_display into a single row
+    if values.shape[1] > max_display:
+        new_values = np.zeros((values.shape[0], max_display))
+        new_values[:, :-1] = values[:, :max_display - 1]
+        new_values[:, -1] = values[:, max_display - 1:].sum(1)
+        new_feature_values = np.zeros(max_display)
+        new_feature_values[:-1] = feature_values[:max_display - 1]
+        new_feature_values[-1] = feature_values[max_display - 1:].sum()
+        feature_names = [*feature_names[:max_display - 1], f"Sum of {values.shape[1] - max_display + 1} other features"]
+        values = new_values
+        feature_values = new_feature_values
+
+    row_height = 0.5
+    ax.get_figure().set_size_inches(8, values.shape[1] * row_height + 2.5)
+
+    # Color range and f(x) scale of every instance, also when they are aggregated
+    vmin, vmax = np.nanpercentile(values.flatten(), [1, 99])
+    fx = values.T.sum(0)
+    fx_scale = np.abs(fx).max()
+    num_instances = values.shape[0]
+    instances = np.arange(num_instances)
+    if max_columns is not None and num_instances > max_columns:
+        starts = np.linspace(0, num_instances, max_columns + 1).astype(np.intp)
+        counts = np.diff(starts)
+        values = np.add.reduceat(values, starts[:-1], axis=0) / counts[:, None]
+        fx = np.add.reduceat(fx, starts[:-1]) / counts
+        instances = starts[:-1] + (counts - 1) / 2
+
+    ax.imshow(
+        values.T,
+        aspect=0.7 * num_instances / values.shape[1],
+        interpolation="nearest",
+        vmin=min(vmin, -vmax),
+        vmax=max(-vmin, vmax),
+        cmap=cmap,
+        extent=(-0.5, num_instances - 0.5, values.shape[1] - 0.5, -0.5),
+    )
+
+    ax.xaxis.set_ticks_position("bottom")
+    ax.yaxis.set_ticks_position("left")
+    ax.spines[["left", "right"]].set_visible(True)
+    ax.spines[["left", "right"]].set_bounds(values.shape[1] - row_height, -row_height)
+    ax.spines[["top", "bottom"]].set_visible(False)
+    ax.tick_params(axis="both", direction="out")
+
+    ax.set_ylim(values.shape[1] - row_height, -3)
+    yticks_pos = np.arange(values.shape[1])
+    ax.yaxis.set_ticks([-1.5, *yticks_pos], ["f(x)", *feature_names], fontsize=13)
+    ax.yaxis.get_ticklines()[0].set_visible(False)
+
+    ax.set_xlim(-0.5, num_instances - 0.5)
+    ax.set_xlabel("Instances")
+
+    # f(x) line above the heat map
+    ax.axhline(-1.5, color="#aaaaaa", linestyle="--", linewidth=0.5)
+    ax.plot(instances, -fx / fx_scale - 1.5, color="#000000", linewidth=1)
+
+    # Global importance bars on the right spine
+    bar_container = ax.barh(
+        yticks_pos,
+        (feature_values / np.abs(feature_values).max()) * num_instances / 20,
+        height=0.7,
+        align="center",
+        color="#000000",
+        left=num_instances * 1.0 - 0.5,
+    )
+    for bar in bar_container:
+        bar.set_clip_on(False)
+
+    mappable = mpl_cm.ScalarMappable(cmap=cmap)
+    mappable.set_array([min(vmin, -vmax), max(-vmin, vmax)])
+    cb = ax.get_figure().colorbar(
+        mappable,
+        ticks=[min(vmin, -vmax), max(-vmin, vmax)],
+        ax=ax,
+        aspect=80,
+        fraction=0.01,
+        pad=0.10,
+    )
+    cb.set_label("SHAP value (impact on model output)", size=12, labelpad=-10)
+    cb.ax.tick_params(labelsize=11, length=0)
+    cb.set_alpha(1)
+    cb.outline.set_visible(False)
+
+def draw_waterfall(ax, expected_value, shap_values, features, feature_names, max_display=10):
+    """
+    shap.plots.waterfall_legacy drawn on an explicit Axes, for one row of SHAP values.
+    """
+    fig = ax.get_figure()
+    style = shap.plots._style.get_style()
+
+    num_features = min(max_display, len(shap_values))
+    row_height = 0.5
+    rng = range(num_features - 1, -1, -1)
+    order = order_by_importance(np.abs(shap_values))
+    pos_lefts, pos_inds, pos_widths = [], [], []
+    neg_lefts, neg_inds, neg_widths = [], [], []
+    loc = expected_value + shap_values.sum()
+    yticklabels = ["" for _ in range(num_features + 1)]
+
+    fig.set_size_inches(8, num_features * row_height + 1.5)
+
+    num_individual = num_features if num_features == len(shap_values) else num_features - 1
+
+    # Locations of the individual features and the dashed connecting lines
+    for i in range(num_individual):
+        sval = shap_values[order[i]]
+        loc -= sval
+        if sval >= 0:
+            pos_inds.append(rng[i])
+            pos_widths.append(sval)
+            pos_lefts.append(loc)
+        else:
+            neg_inds.append(rng[i])
+            neg_widths.append(sval)
+            neg_lefts.append(loc)
+        if num_individual != num_features or i + 4 < num_individual:
+            ax.plot([loc, loc], [rng[i] - 1 - 0.4, rng[i] + 0.4], color="#bbbbbb", linestyle="--", linewidth=0.5, zorder=-1)
+        yticklabels[rng[i]] = shap.utils.format_value(features[order[i]], "%0.03f") + " = " + feature_names[order[i]]
+
+    # One grouped row for the impact of the features not shown
+    if num_features < len(shap_values):
+        yticklabels[0] = f"{len(shap_values) - num_features + 1} other features"
+        remaining_impact = expected_value - loc
+        if remaining_impact < 0:
+            pos_inds.append(0)
+            pos_widths.append(-remaining_impact)
+            pos_lefts.append(loc + remaining_impact)
+        else:
+            neg_inds.append(0)
+            neg_widths.append(-remaining_impact)
+            neg_lefts.append(loc + remaining_impact)
+
+    points = (
+        pos_lefts
+        + list(np.array(pos_lefts) + np.array(pos_widths))
+        + neg_lefts
+        + list(np.array(neg_lefts) + np.array(neg_widths))
+    )
+    dataw = np.max(points) - np.min(points)
+
+    # Invisible bars only size the axes
+    label_padding = np.array([0.1 * dataw if w < 1 else 0 for w in pos_widths])
+    ax.barh(
+        pos_inds,
+        np.array(pos_widths) + label_padding + 0.02 * dataw,
+        left=np.array(pos_lefts) - 0.01 * dataw,
+        color=style.primary_color_positive,
+        alpha=0,
+    )
+    label_padding = np.array([-0.1 * dataw if -w < 1 else 0 for w in neg_widths])
+    ax.barh(
+        neg_inds,
+        np.array(neg_widths) + label_padding - 0.02 * dataw,
+        left=np.array(neg_lefts) + 0.01 * dataw,
+        color=style.primary_color_negative,
+        alpha=0,
+    )
+
+    head_length = 0.08
+    bar_width = 0.8
+    xlen = ax.get_xlim()[1] - ax.get_xlim()[0]
+    bbox = ax.get_window_extent().transformed(fig.dpi_scale_trans.inverted())
+    bbox_to_xscale = xlen / bbox.width
+    hl_scaled = bbox_to_xscale * head_length
+    renderer = fig.canvas.get_renderer()
+
+    # Arrows, with the value inside or, when it does not fit, after the arrow
+    for lefts, inds, widths, sign, color, outside_alignment in (
+        (pos_lefts, pos_inds, pos_widths, 1, style.primary_color_positive, "left"),
+        (neg_lefts, neg_inds, neg_widths, -1, style.primary_color_negative, "right"),
+    ):
+        for left, ind, dist in zip(lefts, inds, widths):
+            arrow_obj = ax.arrow(
+                left,
+                ind,
+                sign * max(sign * dist - hl_scaled, 0.000001),
+                0,
+                head_length=min(sign * dist, hl_scaled),
+                color=color,
+                width=bar_width,
+                head_width=bar_width,
+            )
+            txt_obj = ax.text(
+                left + 0.5 * dist,
+                ind,
+                shap.utils.format_value(dist, "%+0.02f"),
+                horizontalalignment="center",
+                verticalalignment="center",
+                color=style.text_color,
+                fontsize=12,
+            )
+            if txt_obj.get_window_extent(renderer=renderer).width > arrow_obj.get_window_extent(renderer=renderer).width:
+                txt_obj.remove()
+                ax.text(
+                    left + sign * (5 / 72) * bbox_to_xscale + dist,
+                    ind,
+                    shap.utils.format_value(dist, "%+0.02f"),
+                    horizontalalignment=outside_alignment,
+                    verticalalignment="center",
+                    color=color,
+                    fontsize=12,
+                )
 
-    # Convert the BytesIO object to base64
-    img_base64 = base64.b64encode(img_buf.read()).decode("utf-8")
-    plt.close()
-    return img_base64
+    # y ticks twice, the full labels in gray behind the feature names
+    ax.set_yticks(
+        list(range(num_features)) * 2,
+        yticklabels[:-1] + [label.split("=")[-1] for label in yticklabels[:-1]],
+        fontsize=13,
+    )
+
+    for i in range(num_features):
+        ax.axhline(i, color=style.hlines_color, lw=0.5, dashes=(1, 5), zorder=-1)
+
+    # Prior expected value and model prediction
+    ax.axvline(expected_value, 0, 1 / num_features, color=style.vlines_color, linestyle="--", linewidth=0.5, zorder=-1)
+    fx = expected_value + shap_values.sum()
+    ax.axvline(fx, 0, 1, color=style.vlines_color, linestyle="--", linewidth=0.5, zorder=-1)
+
+    ax.xaxis.set_ticks_position("bottom")
+    ax.yaxis.set_ticks_position("none")
+    ax.spines[["right", "top", "left"]].set_visible(False)
+    ax.tick_params(labelsize=13)
+
+    # E[f(X)] and f(x) tick marks, the 1e-8 keeps matplotlib from collapsing the ticks
+    xmin, xmax = ax.get_xlim()
+    ax2 = ax.twiny()
+    ax2.set_xlim(xmin, xmax)
+    ax2.set_xticks([expected_value, expected_value + 1e-8])
+    ax2.set_xticklabels(["\nE[f(X)]", "\n= " + shap.utils.format_value(expected_value, "%0.03f")], fontsize=12, ha="left")
+    ax2.spines[["right", "top", "left"]].set_visible(False)
+
+    ax3 = ax2.twiny()
+    ax3.set_xlim(xmin, xmax)
+    ax3.set_xticks([fx, fx + 1e-8])
+    ax3.set_xticklabels(["f(x)", "= " + shap.utils.format_value(fx, "%0.03f")], fontsize=12, ha="left")
+    tick_labels = ax3.xaxis.get_majorticklabels()
+    tick_labels[0].set_fontstyle("italic")
+    tick_labels[0].set_transform(tick_labels[0].get_transform() + mpl_transforms.ScaledTranslation(-10 / 72.0, 0, fig.dpi_scale_trans))
+    tick_labels[1].set_transform(tick_labels[1].get_transform() + mpl_transforms.ScaledTranslation(12 / 72.0, 0, fig.dpi_scale_trans))
+    tick_labels[1].set_color(style.tick_labels_color)
+    ax3.spines[["right", "top", "left"]].set_visible(False)
+
+    tick_labels = ax2.xaxis.get_majorticklabels()
+    tick_labels[0].set_fontstyle("italic")
+    tick_labels[0].set_transform(tick_labels[0].get_transform() + mpl_transforms.ScaledTranslation(-20 / 72.0, 0, fig.dpi_scale_trans))
+    tick_labels[1].set_transform(tick_labels[1].get_transform() + mpl_transforms.ScaledTranslation(22 / 72.0, -1 / 72.0, fig.dpi_scale_trans))
+    tick_labels[1].set_color(style.tick_labels_color)
+
+    tick_labels = ax.yaxis.get_majorticklabels()
+    for i in range(num_features):
+        tick_labels[i].set_color(style.tick_labels_color)
+
+# Large cohorts: above LARGE_COHORT_ROWS rows ("cohort_rendering" "auto"), beeswarm rows draw at most
+# about BEESWARM_MAX_POINTS dots and the heatmap at most HEATMAP_MAX_COLUMNS instance columns, which
+# bounds rendering time. The heatmap is drawn about 800 pixels wide, so more columns only alias.
+COHORT_RENDERINGS = ("auto", "full", "reduced")
+LARGE_COHORT_ROWS = int(os.getenv("LARGE_COHORT_ROWS", "2000"))
+BEESWARM_MAX_POINTS = int(os.getenv("BEESWARM_MAX_POINTS", "2000"))
+HEATMAP_MAX_COLUMNS = int(os.getenv("HEATMAP_MAX_COLUMNS", "800"))
+
+def resolve_cohort_rendering(cohort_rendering, n_rows):
+    if cohort_rendering == "auto":
+        return "reduced" if n_rows > LARGE_COHORT_ROWS else "full"
+    return cohort_rendering
+
+def get_cohort_report(cohort_rendering, n_rows):
+    report = {"mode": cohort_rendering, "rows": n_rows}
+    if cohort_rendering == "reduced":
+        report.update(beeswarm_max_points=BEESWARM_MAX_POINTS, heatmap_max_columns=HEATMAP_MAX_COLUMNS)
+    return report
+
+def get_beeswarm(explanation, reduced=False):
+    max_display = 15
+    fig, ax = new_figure(figsize=(8, min(explanation.shape[1], max_display) * 0.4 + 1.5))
+    draw_beeswarm(ax, explanation, max_display=max_display, max_points=BEESWARM_MAX_POINTS if reduced else None)
+
+    x_min, x_max = ax.get_xlim()
+    draw_feature_labels(ax, x_min - 0.030 * (x_max - x_min))
+
+    fig.tight_layout()
+    return figure_to_png(fig, bbox_inches='tight')
+
+def get_heatmap(explanation, reduced=False):
+    fig, ax = new_figure()
+    draw_heatmap(ax, explanation, max_display=15, max_columns=HEATMAP_MAX_COLUMNS if reduced else None)
+    # f(x) above the taxa is italic like them, the grouped row at the bottom is upright
+    draw_feature_labels(ax, -1, normal_labels=(-1,))
+    return figure_to_png(fig, bbox_inches='tight')
 
 def get_local_waterfall_plot(subject_id, shap_value_object):
-    plt.ioff()
-    plt.figure()
-    max_display=8
-    shap_df=shap_value_object.shap_df
-    base_value = shap_value_object.base_value
-    fig = shap.plots._waterfall.waterfall_legacy(base_value, shap_df.loc[subject_id],
-                                        show=False, features=shap_df.loc[subject_id], max_display=max_display)
-    ax = fig.gca()
+    fig, ax = new_figure()
+    max_display = 8
+    shap_df = shap_value_object.shap_df
+    row = shap_df.loc[subject_id]
+    draw_waterfall(ax, shap_value_object.base_value, row.to_numpy(), row.to_numpy(), list(shap_df.columns), max_display=max_display)
+
+    # Only the bottom row is upright, both of its labels when it groups the other features
+    num_features = min(max_display, len(row))
+    normal_labels = (0, num_features) if num_features < len(row) else (0,)
     x_min, x_max = ax.get_xlim()
-    x_range = x_max - x_min
+    draw_feature_labels(ax, x_min - 0.030 * (x_max - x_min), normal_labels=normal_labels)
 
-    yticks = ax.get_yticks()
-    yticklabels = [label.get_text() for label in ax.get_yticklabels()]  
+    fig.tight_layout()
+    return figure_to_png(fig)
 
-    ax.set_yticks([])
-    ax.set_yticklabels([])  
-    feature_position = x_min - 0.030 * x_range
+# Data-only plot payloads: the numbers each plot is drawn from, for clients that render charts
+# themselves. Features are ranked and grouped the same way as in the rendered plots.
+ARRAY_ENCODINGS = ("list", "float32")
 
-    for y, label in zip(yticks, yticklabels):
-        ax.text(
-            feature_position,
-            y, 
-            label.replace("_", " "),  
-            fontsize=12,
-            fontstyle="italic" if label != yticklabels[0] else "normal",
-            verticalalignment="center",
-            horizontalalignment="right"
+def encode_array(values, array_encoding="list"):
+    """
+    "list" gives nested JSON lists, "float32" a {"dtype", "shape", "data"} object with
+    the little-endian float32 bytes base64 encoded.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if array_encoding == "float32":
+        return {
+            "dtype": "float32",
+            "shape": list(values.shape),
+            "data": base64.b64encode(values.astype("<f4").tobytes()).decode("utf-8"),
+        }
+    # JSON has no NaN, missing values become null
+    return np.where(np.isnan(values), None, values).tolist()
+
+def rank_features(mean_abs, max_display):
+    """
+    Feature positions by decreasing mean |SHAP|, cut to max_display. When features are
+    left out, the last shown position stands for the group of all remaining features.
+    Returns (shown, grouped) position arrays, grouped empty when nothing is left out.
+    """
+    order = order_by_importance(mean_abs)
+    if len(order) <= max_display:
+        return order, order[:0]
+    return order[:max_display], order[max_display - 1:]
+
+def get_heatmap_data(explanation, max_display=15, array_encoding="list"):
+    values = explanation.values
+    mean_abs = np.abs(values).mean(0)
+    shown, grouped = rank_features(mean_abs, max_display)
+    feature_names = [explanation.feature_names[i] for i in shown]
+    contributions = values[:, shown]
+    feature_importance = mean_abs[shown]
+    if len(grouped):
+        # As draw_heatmap's bar: the sum of the grouped features' importances, not the importance of their sum
+        feature_names[-1] = f"Sum of {len(grouped)} other features"
+        contributions[:, -1] = values[:, grouped].sum(1)
+        feature_importance[-1] = mean_abs[grouped].sum()
+
+    instance_order = np.argsort(values.sum(1))[::-1]
+    return {
+        "feature_names": feature_names,
+        "feature_importance": encode_array(feature_importance, array_encoding),
+        "instance_order": instance_order.tolist(),
+        "fx": encode_array(values.sum(1)[instance_order], array_encoding),
+        "values": encode_array(contributions[instance_order].T, array_encoding),
+    }
+
+def get_beeswarm_data(explanation, max_display=15, array_encoding="list"):
+    values = explanation.values
+    features = np.asarray(explanation.data, dtype=np.float64)
+    shown, grouped = rank_features(np.abs(values).mean(0), max_display)
+    feature_names = [explanation.feature_names[i] for i in shown]
+    contributions = values[:, shown]
+    feature_values = features[:, shown]
+    if len(grouped):
+        feature_names[-1] = f"Sum of {len(grouped)} other features"
+        contributions[:, -1] = values[:, grouped].sum(1)
+        feature_values[:, -1] = np.nan
+
+    return {
+        "feature_names": feature_names,
+        "mean_abs_shap": encode_array(np.abs(contributions).mean(0), array_encoding),
+        "values": encode_array(contributions.T, array_encoding),
+        "feature_values": encode_array(feature_values.T, array_encoding),
+    }
+
+def get_waterfall_data(subject_id, shap_value_object, max_display=8, array_encoding="list"):
+    shap_df = shap_value_object.shap_df
+    position = shap_df.index.get_loc(subject_id)
+    row = shap_df.iloc[position].to_numpy()
+    features = np.asarray(shap_value_object.explanation.data, dtype=np.float64)[position]
+    shown, grouped = rank_features(np.abs(row), max_display)
+    feature_names = [shap_df.columns[i] for i in shown]
+    contributions = row[shown]
+    feature_values = features[shown]
+    if len(grouped):
+        feature_names[-1] = f"{len(grouped)} other features"
+        contributions[-1] = row[grouped].sum()
+        feature_values[-1] = np.nan
+
+    base_value = float(shap_value_object.base_value)
+    return {
+        "base_value": base_value,
+        "fx": base_value + float(row.sum()),
+        "feature_names": feature_names,
+        "values": encode_array(contributions, array_encoding),
+        "feature_values": encode_array(feature_values, array_encoding),
+    }
+
+RENDER_MODES = ("png", "data")
+
+def render_plot(plot, shap_value_object, render="png", array_encoding="list", subject_id=None, reduced=False):
+    """
+    Render plot ("heatmap", "beeswarm" or "waterfall" of subject_id) as PNG bytes,
+    or with render "data" as its data-only payload without touching matplotlib.
+    reduced draws a large cohort's heatmap and beeswarm with bounded work.
+    """
+    explanation = shap_value_object.explanation
+    if render == "data":
+        if plot == "heatmap":
+            return get_heatmap_data(explanation, array_encoding=array_encoding)
+        if plot == "beeswarm":
+            return get_beeswarm_data(explanation, array_encoding=array_encoding)
+        return get_waterfall_data(subject_id, shap_value_object, array_encoding=array_encoding)
+
+    if plot == "heatmap":
+        return get_heatmap(explanation, reduced)
+    if plot == "beeswarm":
+        return get_beeswarm(explanation, reduced)
+    return get_local_waterfall_plot(subject_id=subject_id, shap_value_object=shap_value_object)
+
+PLOT_OUTPUTS = ("heatmap", "beeswarm", "waterfall")
+
+# Waterfalls of a batch are rendered concurrently, plots never share pyplot state (see new_figure)
+def new_render_pool():
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("RENDER_WORKERS", "4")),
+        thread_name_prefix="render"
+    )
+
+render_pool = new_render_pool()
+
+def render_waterfall(idx, shap_objects, render="png", array_encoding="list"):
+    """
+    Waterfall entry of row idx, shap_objects the ShapValueObject of one class or a dict
+    of them keyed by class index.
+    """
+    if isinstance(shap_objects, dict):
+        return {
+            "id": idx,
+            "waterfall": {
+                key: render_plot("waterfall", shap_object, render, array_encoding, subject_id=idx)
+                for key, shap_object in shap_objects.items()
+            }
+        }
+    return {"id": idx, "waterfall": render_plot("waterfall", shap_objects, render, array_encoding, subject_id=idx)}
+
+def waterfall_shap_objects(shap_tensor, class_index):
+    # Built once per batch, every row's waterfall reads from the same objects
+    return explain_classes(shap_tensor, class_index, lambda shap_object: shap_object)
+
+def render_output(output, shap_tensor, class_index, render="png", array_encoding="list", cohort_rendering="full"):
+    """
+    Render one of PLOT_OUTPUTS for class_index ("all" keys every class), waterfall as
+    one entry per row rendered on render_pool.
+    """
+    if output != "waterfall":
+        reduced = cohort_rendering == "reduced"
+        return explain_classes(
+            shap_tensor,
+            class_index,
+            lambda shap_object: render_plot(output, shap_object, render, array_encoding, reduced=reduced)
         )
-        
-    plt.tight_layout()
-    img_buf = BytesIO()
-    plt.savefig(img_buf, format='png')
-    img_buf.seek(0)
+    shap_objects = waterfall_shap_objects(shap_tensor, class_index)
+    return list(render_pool.map(lambda idx: render_waterfall(idx, shap_objects, render, array_encoding), shap_tensor.X.index))
+
+def iter_waterfalls(shap_tensor, class_index, render="png", array_encoding="list"):
+    """
+    Yield (row position, waterfall entry) of every row as render_pool finishes them.
+    A row that fails to render yields {"id", "error"} instead of stopping the batch.
+    """
+    shap_objects = waterfall_shap_objects(shap_tensor, class_index)
+    futures = {
+        render_pool.submit(render_waterfall, idx, shap_objects, render, array_encoding): (position, idx)
+        for position, idx in enumerate(shap_tensor.X.index)
+    }
+    try:
+        for future in as_completed(futures):
+            position, idx = futures[future]
+            try:
+                yield position, future.result()
+            except Exception as e:
+                logger.error(f"❌ Failed to render waterfall of row {idx}: {e}")
+                yield position, {"id": idx, "error": str(e)}
+    finally:
+        # The client went away mid-stream, drop the rows not started yet
+        for future in futures:
+            future.cancel()
+
+def iter_waterfalls_cached(cache_key, shap_tensor, class_index, render="png", array_encoding="list"):
+    """iter_waterfalls, storing the whole batch in plot_cache once every row rendered."""
+    entries = [None] * len(shap_tensor.X)
+    for position, entry in iter_waterfalls(shap_tensor, class_index, render, array_encoding):
+        entries[position] = entry
+        yield position, entry
+    if not any("error" in entry for entry in entries):
+        plot_cache.put(cache_key, entries)
+
+def map_images(value, name, func):
+    """
+    Copy of a render_output result with every PNG replaced by func(image name, png bytes).
+    Images are named after their output, then the row id of a waterfall and the class
+    index when every class is rendered, e.g. "waterfall_S1_class0".
+    """
+    if isinstance(value, bytes):
+        return func(name, value)
+    if isinstance(value, dict):
+        return {key: map_images(item, f"{name}_class{key}", func) for key, item in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], dict) and "waterfall" in value[0]:
+        return [
+            {**entry, "waterfall": map_images(entry["waterfall"], f"{name}_{re.sub(r'[^A-Za-z0-9._-]', '_', str(entry['id']))}", func)}
+            for entry in value
+        ]
+    return value
+
+class PlotCache(RowCache):
+    """
+    LRU cache of rendered plots (PNG bytes or data payloads) keyed by
+    (plot, model run_id, input digest, plot parameters), bounded by payload size.
+    Also counts the conditional requests answered with 304.
+    """
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes)
+        self.not_modified = 0
+
+    def _sizeof(self, value):
+        image_sizes = []
+        rest = map_images(value, "", lambda name, raw: image_sizes.append(len(raw)))
+        return sum(image_sizes) + len(json.dumps(rest))
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats["not_modified"] = self.not_modified
+        return stats
+
+plot_cache = PlotCache(max_bytes=int(os.getenv("PLOT_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# Part of every plot key and ETag, bump it when plot rendering changes
+RENDER_VERSION = 2
+
+def get_plot_key(model_loader, X, class_index, render, array_encoding, cohort_rendering="full"):
+    """
+    Cache key shared by every plot of one request: the model run, a digest of the aligned
+    input rows in order, and the parameters that change how the plots look.
+    """
+    rows_digest = hashlib.blake2b(b"".join(hash_rows(X)), digest_size=16).hexdigest()
+    return (
+        RENDER_VERSION, model_loader.run_id, rows_digest, class_index,
+        model_loader.shap_mode, model_loader.tree_fraction, render, array_encoding, cohort_rendering
+    )
+
+def get_etag(*parts):
+    # Rendering is deterministic, so the key alone identifies the response body
+    return hashlib.blake2b(json.dumps(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+def not_modified(etag):
+    plot_cache.record_not_modified()
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
 
-    # Convert the BytesIO object to base64
-    img_base64 = base64.b64encode(img_buf.read()).decode("utf-8")
-    plt.close()
-    return img_base64
+class PlotStore:
+    """
+    Writes rendered PNGs to an S3-compatible bucket, for responses that return object
+    keys instead of images. endpoint_url points at MinIO or a local stand-in, credentials
+    come from the usual AWS environment variables. The boto3 client is created on first use.
+    """
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, upload_workers=8):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self.upload_workers = upload_workers
+        self.uploads = 0
+        self._client = None
+        self._lock = threading.Lock()
+
+    def key_for(self, store_prefix, name):
+        return "/".join(part for part in (self.prefix, store_prefix, f"{name}.png") if part)
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                import boto3
+                self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+            return self._client
+
+    def put_many(self, uploads):
+        """Upload (key, png bytes) pairs, several at a time."""
+        client = self._get_client()
+        def put(upload):
+            key, raw = upload
+            client.put_object(Bucket=self.bucket, Key=key, Body=raw, ContentType="image/png")
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.upload_workers, len(uploads)))) as executor:
+            list(executor.map(put, uploads))
+        with self._lock:
+            self.uploads += len(uploads)
+
+    def stats(self):
+        with self._lock:
+            return {"bucket": self.bucket, "uploads": self.uploads}
+
+plot_store = PlotStore(
+    bucket=os.getenv("PLOT_STORE_BUCKET"),
+    prefix=os.getenv("PLOT_STORE_PREFIX", ""),
+    endpoint_url=os.getenv("PLOT_STORE_ENDPOINT_URL") or None,
+    upload_workers=int(os.getenv("PLOT_STORE_UPLOAD_WORKERS", "8"))
+) if os.getenv("PLOT_STORE_BUCKET") else None
+
+RESPONSE_FORMATS = ("json", "image", "multipart", "key")
+
+def store_images(value, name, store_prefix):
+    """Write the PNGs of a render_output result to plot_store, returns it with their keys in place."""
+    uploads = []
+    def stage(image_name, raw):
+        key = plot_store.key_for(store_prefix, image_name)
+        uploads.append((key, raw))
+        return key
+
+    value = map_images(value, name, stage)
+    if uploads:
+        plot_store.put_many(uploads)
+    return value
+
+def iter_plot_images(plots):
+    for name, get_plot in plots.values():
+        images = []
+        map_images(get_plot(), name, lambda image_name, raw: images.append((image_name, raw)))
+        yield from images
+
+def stream_multipart(boundary, payload, images):
+    """
+    multipart/mixed body: a JSON part named "metadata" with payload, then one image/png
+    part per (name, png bytes) of images, consumed one at a time while streaming.
+    """
+    yield (
+        f"--{boundary}\r\nContent-Type: application/json\r\n"
+        f"Content-Disposition: inline; name=\"metadata\"\r\n\r\n{json.dumps(payload)}\r\n"
+    ).encode("utf-8")
+    try:
+        for name, raw in images:
+            yield (
+                f"--{boundary}\r\nContent-Type: image/png\r\nContent-Length: {len(raw)}\r\n"
+                f"Content-Disposition: inline; name=\"{name}\"; filename=\"{name}.png\"\r\n\r\n"
+            ).encode("utf-8")
+            yield raw
+            yield b"\r\n"
+    except Exception as e:
+        # The status line is already sent, the missing closing boundary tells the client
+        logger.error(f"❌ Failed to stream plots: {e}")
+        return
+    yield f"--{boundary}--\r\n".encode("utf-8")
+
+def plot_response(etag, payload, plots, response_format="json", store_prefix=None):
+    """
+    Respond with the JSON fields of payload and plots, {field: (image name, function
+    returning the render_output result)}, in response_format:
+    - "json": PNGs base64 encoded in the JSON body
+    - "key": PNGs written to plot_store, the JSON body holds their object keys
+    - "image": the only PNG as an image/png body
+    - "multipart": streamed multipart/mixed, see stream_multipart. Plots not rendered yet
+      are rendered while the previous ones are sent.
+    """
+    if response_format == "multipart":
+        boundary = f"plots-{etag}"
+        response = app.response_class(
+            stream_multipart(boundary, payload, iter_plot_images(plots)),
+            content_type=f"multipart/mixed; boundary={boundary}"
+        )
+    elif response_format == "image":
+        images = list(iter_plot_images(plots))
+        if len(images) != 1:
+            return jsonify({"error": f"response_format 'image' returns exactly one image, this request renders {len(images)}. Use 'multipart'."}), 400
+        name, raw = images[0]
+        response = app.response_class(raw, mimetype="image/png")
+        response.headers["Content-Disposition"] = f'inline; filename="{name}.png"'
+    elif response_format == "key":
+        store_prefix = store_prefix or f"explanations/{etag}"
+        payload = {**payload, **{field: store_images(get_plot(), name, store_prefix) for field, (name, get_plot) in plots.items()}}
+        response = jsonify({**payload, "bucket": plot_store.bucket})
+    else:
+        payload = {**payload, **{field: map_images(get_plot(), name, lambda _, raw: encode_png(raw)) for field, (name, get_plot) in plots.items()}}
+        response = jsonify(payload)
+
+    response.set_etag(etag)
+    return response
+
+def waterfall_stream_response(etag, metadata, rows, response_format="json", store_prefix=None, predictions=None):
+    """
+    Streamed NDJSON of a waterfall batch: a first line with metadata, then one line per
+    (row position, waterfall entry) of rows as they arrive, with the row's prediction
+    when predictions are given. PNGs are base64 encoded, or with response_format "key"
+    written to plot_store and replaced by their keys. A row that fails carries "error".
+    """
+    store_prefix = store_prefix or f"explanations/{etag}"
+
+    def encode(position, entry):
+        try:
+            if response_format == "key":
+                entry = store_images([entry], "waterfall", store_prefix)[0]
+            else:
+                entry = map_images([entry], "waterfall", lambda _, raw: encode_png(raw))[0]
+        except Exception as e:
+            logger.error(f"❌ Failed to store waterfall of row {entry['id']}: {e}")
+            entry = {"id": entry["id"], "error": str(e)}
+        if predictions is not None:
+            entry = {**entry, "predict": predictions[position]}
+        return json.dumps(entry) + "\n"
+
+    def generate():
+        yield json.dumps(metadata) + "\n"
+        for position, entry in rows:
+            yield encode(position, entry)
+
+    response = app.response_class(generate(), mimetype="application/x-ndjson")
+    response.set_etag(etag)
+    return response
+
+def supports_sparse_prediction(model):
+    # scikit-learn reads implicit entries as zeros, XGBoost would treat them as missing values
+    return type(model).__module__.startswith("sklearn.")
+
+def compute_prediction_rows(model, X):
+    if isinstance(X, SparseFrame):
+        if supports_sparse_prediction(model):
+            try:
+                return compute_prediction_rows(model, X.matrix)
+            except (TypeError, ValueError):
+                # Estimator without sparse input support
+                pass
+        X = X.to_dense()
+
+    # Get predicted probability
+    y_pred_proba = model.predict_proba(X)[:, 1]
+    y_pred_class = model.predict(X)
+    return list(zip(y_pred_proba.tolist(), y_pred_class.tolist()))
+
+class Histogram:
+    """Count of observed values per bucket upper bound (the last bucket is unbounded) and their sum."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def stats(self):
+        return {
+            "buckets": {**{f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)}, "le_inf": self.counts[-1]},
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else 0.0,
+        }
+
+class PredictionBatch:
+    def __init__(self):
+        self.requests = []  # [X, enqueued_at, result, error]
+        self.rows = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+class PredictBatcher:
+    """
+    Micro-batches concurrent predictions of the same model version and input columns.
+    The first request of a batch waits up to max_wait_ms for others (or until the batch
+    holds max_rows rows), then predicts every request's rows in one predict_proba/predict
+    call and hands each request its slice. If that call fails, each request is predicted
+    on its own so one bad payload only fails its caller. Batch sizes and queue waits are
+    kept as histograms.
+    Sparse inputs, requests of max_rows rows or more, and every request when
+    max_wait_ms is 0 are predicted on their own.
+    """
+
+    def __init__(self, max_wait_ms, max_rows):
+        self.max_wait_ms = max_wait_ms
+        self.max_rows = max_rows
+        self.batch_rows = Histogram((1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.batch_requests = Histogram((1, 2, 4, 8, 16, 32, 64))
+        self.queue_wait_ms = Histogram((0.5, 1, 2, 5, 10, 20, 50, 100))
+        self._batches = {}  # (run_id, columns) -> open PredictionBatch
+        self._lock = threading.Lock()
+
+    def compute(self, model, run_id, X):
+        if self.max_wait_ms <= 0 or run_id is None or isinstance(X, SparseFrame) or len(X) >= self.max_rows:
+            return compute_prediction_rows(model, X)
+
+        # Models without logged input columns get each request's own columns, which must not be mixed
+        key = (run_id, tuple(X.columns))
+        entry = [X, time.perf_counter(), None, None]
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._batches[key] = PredictionBatch()
+            batch.requests.append(entry)
+            batch.rows += len(X)
+            if batch.rows >= self.max_rows:
+                # Closed, later requests start the next batch
+                del self._batches[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_wait_ms / 1000)
+            with self._lock:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+            self._run(model, batch)
+        else:
+            batch.done.wait()
+
+        if entry[3] is not None:
+            raise entry[3]
+        return entry[2]
+
+    def _run(self, model, batch):
+        start = time.perf_counter()
+        try:
+            frames = [X for X, _, _, _ in batch.requests]
+            rows = compute_prediction_rows(model, frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True))
+            offset = 0
+            for entry in batch.requests:
+                entry[2] = rows[offset:offset + len(entry[0])]
+                offset += len(entry[0])
+        except Exception as e:
+            if len(batch.requests) == 1:
+                batch.requests[0][3] = e
+            else:
+                logger.error(f"⚠️ Batched prediction of {len(batch.requests)} requests failed, predicting them one by one: {e}")
+                for entry in batch.requests:
+                    try:
+                        entry[2] = compute_prediction_rows(model, entry[0])
+                    except Exception as request_error:
+                        entry[3] = request_error
+        finally:
+            with self._lock:
+                self.batch_rows.observe(batch.rows)
+                self.batch_requests.observe(len(batch.requests))
+                for _, enqueued_at, _, _ in batch.requests:
+                    self.queue_wait_ms.observe((start - enqueued_at) * 1000)
+            batch.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_wait_ms": self.max_wait_ms,
+                "max_rows": self.max_rows,
+                "batch_rows": self.batch_rows.stats(),
+                "batch_requests": self.batch_requests.stats(),
+                "queue_wait_ms": self.queue_wait_ms.stats(),
+            }
+
+predict_batcher = PredictBatcher(
+    max_wait_ms=float(os.getenv("PREDICT_BATCH_WAIT_MS", "5")),
+    max_rows=int(os.getenv("PREDICT_BATCH_MAX_ROWS", "64"))
+)
+
+def get_predictions(model, X, run_id=None):
+    rows = get_rows_cached("predict", run_id, X, lambda X_missing: predict_batcher.compute(model, run_id, X_missing))
+
+    return [
+        {
+            "id": idx,
+            "proba": pred_proba,
+            "class": pred_class,
+        }
+        for idx, (pred_proba, pred_class) in zip(X.index, rows)
+    ]
+
+class AlignmentPlan:
+    """
+    Precompiled mapping from an incoming column layout to the model's input columns.
+
+    source_positions[i] is the position in the incoming frame of the column that
+    lands at target_positions[i]; target columns missing from the input are left
+    at the default value.
+    """
+
+    def __init__(self, n_features, source_positions, target_positions, is_identity):
+        self.n_features = n_features
+        self.source_positions = source_positions
+        self.target_positions = target_positions
+        self.is_identity = is_identity
+
+    def apply(self, input_df, input_columns, default_value):
+        aligned = np.full((len(input_df), self.n_features), default_value, dtype=np.float64)
+        if len(self.source_positions):
+            aligned[:, self.target_positions] = input_df.iloc[:, self.source_positions].to_numpy(dtype=np.float64)
+        return pd.DataFrame(aligned, columns=input_columns, index=input_df.index, copy=False)
+
+    def apply_sparse(self, input_frame, input_columns):
+        # Relabel stored entries to their target column and drop the unused ones, missing columns stay implicit zeros
+        target_of_source = np.full(len(input_frame.columns), -1, dtype=np.intp)
+        target_of_source[self.source_positions] = self.target_positions
+        coo = input_frame.matrix.tocoo()
+        target_columns = target_of_source[coo.col]
+        keep = target_columns >= 0
+        matrix = scipy.sparse.csr_matrix(
+            (coo.data[keep], (coo.row[keep], target_columns[keep])),
+            shape=(len(input_frame), self.n_features)
+        )
+        return SparseFrame(matrix, pd.Index(input_columns), input_frame.index)
+
+@lru_cache(maxsize=256)
+def compile_alignment_plan(input_columns, incoming_columns):
+    """
+    Build (once per model column tuple and incoming column tuple) the integer index map
+    used by transformer. The first occurrence wins for duplicated incoming columns.
+    """
+    if input_columns == incoming_columns:
+        return AlignmentPlan(len(input_columns), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), True)
+
+    incoming_positions = {}
+    for position, column in enumerate(incoming_columns):
+        incoming_positions.setdefault(column, position)
+
+    source_positions = []
+    target_positions = []
+    for position, column in enumerate(input_columns):
+        if column in incoming_positions:
+            source_positions.append(incoming_positions[column])
+            target_positions.append(position)
+
+    return AlignmentPlan(
+        len(input_columns),
+        np.asarray(source_positions, dtype=np.intp),
+        np.asarray(target_positions, dtype=np.intp),
+        False
+    )
+
+class SparseFrame:
+    """
+    Sparse counterpart of the input DataFrame: a CSR matrix with the DataFrame's
+    columns and index. It stays sparse through transformer and model prediction
+    and is densified with to_dense() only for SHAP.
+    """
+
+    def __init__(self, matrix, columns, index):
+        self.matrix = scipy.sparse.csr_matrix(matrix, dtype=np.float64)
+        self.matrix.sum_duplicates()
+        self.columns = columns
+        self.index = index
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def take(self, positions):
+        return SparseFrame(self.matrix[positions], self.columns, self.index[positions])
+
+    def to_dense(self):
+        return pd.DataFrame(self.matrix.toarray(), columns=self.columns, index=self.index, copy=False)
+
+    def head(self, n=5):
+        return self.take(np.arange(min(n, len(self)))).to_dense()
+
+def to_dense(X):
+    return X.to_dense() if isinstance(X, SparseFrame) else X
+
+SPARSE_FORMATS = ("coo", "csr")
+
+def parse_sparse_split(sparse_split):
+    """
+    Build a SparseFrame from a "sparse_split" request object: "columns", optional
+    "n_rows" and either "format": "coo" with "row"/"col"/"data" triplets or
+    "format": "csr" with "indptr"/"indices"/"data". Raises ValueError when malformed.
+    """
+    columns = sparse_split.get("columns")
+    sparse_format = sparse_split.get("format", "coo")
+    if not isinstance(columns, list) or sparse_format not in SPARSE_FORMATS:
+        raise ValueError(f"Expecting 'columns' and a 'format' of {list(SPARSE_FORMATS)}.")
+
+    data = np.asarray(sparse_split.get("data", []), dtype=np.float64)
+    if sparse_format == "coo":
+        row = np.asarray(sparse_split.get("row", []), dtype=np.intp)
+        col = np.asarray(sparse_split.get("col", []), dtype=np.intp)
+        n_rows = sparse_split.get("n_rows", int(row.max()) + 1 if len(row) else 0)
+        if len(row) != len(data) or len(col) != len(data) or (len(data) and (row.min() < 0 or col.min() < 0)):
+            raise ValueError("'row', 'col' and 'data' must be non-negative triplets of the same length.")
+        matrix = scipy.sparse.coo_matrix((data, (row, col)), shape=(n_rows, len(columns)))
+    else:
+        indptr = np.asarray(sparse_split.get("indptr", [0]), dtype=np.intp)
+        indices = np.asarray(sparse_split.get("indices", []), dtype=np.intp)
+        matrix = scipy.sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(columns)))
+        matrix.check_format(full_check=True)
+
+    return SparseFrame(matrix, pd.Index(columns), pd.RangeIndex(matrix.shape[0]))
+
+def read_input_frame(req_json):
+    """
+    Read the request input, either "dataframe_split" (dense rows) or "sparse_split"
+    (see parse_sparse_split). Returns (DataFrame or SparseFrame, error).
+    """
+    if "sparse_split" in req_json:
+        try:
+            return parse_sparse_split(req_json["sparse_split"]), None
+        except (TypeError, ValueError) as e:
+            return None, f"Invalid 'sparse_split'. {e}"
+
+    if "dataframe_split" not in req_json or "data" not in req_json["dataframe_split"] or "columns" not in req_json["dataframe_split"]:
+        return None, "Invalid request format. Expecting 'dataframe_split' with 'data' and 'columns', or 'sparse_split'."
+
+    columns = req_json["dataframe_split"]["columns"]
+    data = req_json["dataframe_split"]["data"]
+    return pd.DataFrame(data=data, columns=columns), None
 
 def transformer(input_df, input_columns, defualt_value = 0):
     """
@@ -234,21 +2144,25 @@ def transformer(input_df, input_columns, defualt_value = 0):
     - Remove extra columns that were not used in training
     - Add missing columns with a default value of defualt_value (0)
     - Ensure column order matches the model
+    The column mapping is compiled once per (model columns, incoming columns) and applied
+    as a single gather into a preallocated float matrix. A SparseFrame stays sparse
+    (missing columns are implicit zeros) unless defualt_value is not 0.
     """
     if input_columns is None:
         logger.error("⚠️ No input column information available, returning original DataFrame.")
         return input_df
 
-    # Step 1: Remove extra columns that were not used during training
-    transformed_df = input_df.loc[:, input_df.columns.intersection(input_columns)].copy()
-
-    # Step 2: Add missing columns with default value defualt_value
-    missing_cols = set(input_columns) - set(transformed_df.columns)
-    for col in missing_cols:
-        transformed_df[col] = defualt_value
+    plan = compile_alignment_plan(tuple(input_columns), tuple(input_df.columns))
+    if plan.is_identity:
+        return input_df
 
-    # Step 3: Ensure column order matches the trained model
-    transformed_df = transformed_df[input_columns]
+    if isinstance(input_df, SparseFrame):
+        if defualt_value == 0:
+            transformed_df = plan.apply_sparse(input_df, input_columns)
+        else:
+            transformed_df = plan.apply(input_df.to_dense(), input_columns, defualt_value)
+    else:
+        transformed_df = plan.apply(input_df, input_columns, defualt_value)
 
     logger.info("✅ Transformed input DataFrame to match trained model")
     return transformed_df
@@ -257,160 +2171,833 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 app = Flask(__name__)
 
-# Model and prediction api
-@app.route("/v1/explain/beeswarm/<model_name>", methods=["POST"])
-def explain_beeswarm(model_name):
-    model_loader = ModelLoader(model_name)
-    model, input_columns, explainer = model_loader.load()
-    
-    if model is None:
-        return jsonify({"error": f"Model {model_name} not found"}), 404
-    try:
-        req_json = request.get_json()
+# Startup prewarming
+startup_status = {"ready": False, "models": {}}
+# Seconds since the process started, see get_startup_report
+startup_timings = {}
 
-        if "dataframe_split" not in req_json or "data" not in req_json["dataframe_split"] or "columns" not in req_json["dataframe_split"]:
-            return jsonify({"error": "Invalid request format. Expecting 'dataframe_split' with 'data' and 'columns'."}), 400
+# Start of the process that imported this module: under gunicorn the master, whose value the
+# forked workers inherit, as their own create_time() would be their fork time
+process_start_time = psutil.Process().create_time()
 
-        # Convert input data to DataFrame
-        columns = req_json["dataframe_split"]["columns"]
-        data = req_json["dataframe_split"]["data"]
+def seconds_since_process_start():
+    return round(time.time() - process_start_time, 3)
 
-        input_df = pd.DataFrame(data=data, columns=columns)
-        input_data = transformer(input_df, input_columns)  
-
-        shap_object = get_shap_value(explainer, X=input_data)
-        beeswarm = get_beeswarm(shap_object.explanation)
+def get_startup_report():
+    """
+    Where cold start time goes: interpreter start up to importing this module, the module
+    import, every eager and lazy module import, readiness (prewarm done) and the first
+    request other than a health check, for tracking startup regressions.
+    """
+    return {
+        "interpreter_seconds": round(module_import_start - process_start_time, 3),
+        **startup_timings,
+        "imports": import_times,
+        "numba_cache_dir": os.environ.get("NUMBA_CACHE_DIR"),
+    }
 
-        return jsonify({"explain": beeswarm})
-    
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+def get_preload_model_names():
+    """
+    Models to preload at startup: comma-separated PRELOAD_MODELS, falling back to
+    the MODEL_NAME set by the deployment manifest.
+    """
+    model_names = os.getenv("PRELOAD_MODELS") or os.getenv("MODEL_NAME", "")
+    return [name.strip() for name in model_names.split(",") if name.strip()]
 
-@app.route("/v1/explain/heatmap/<model_name>", methods=["POST"])
-def explain_heatmap(model_name):
+def warm_up_model(model_name):
+    """
+    Load a model, its input columns and explainer, then run a one-row synthetic
+    predict and waterfall so numba JIT and matplotlib are warm before traffic.
+    Returns details for the readiness report.
+    """
     model_loader = ModelLoader(model_name)
     model, input_columns, explainer = model_loader.load()
-    
-    if model is None:
-        return jsonify({"error": f"Model {model_name} not found"}), 404
-    try:
-        req_json = request.get_json()
+    details = {"version": model_loader.version, "shap_mode": model_loader.shap_mode}
+    if input_columns is None:
+        logger.error(f"⚠️ No input columns for {model_name}, skipping synthetic warm-up")
+        return details
+
+    X = pd.DataFrame([[0.0] * len(input_columns)], columns=input_columns)
+    model.predict_proba(X)
+    if explainer is not None:
+        shap_object = get_shap_value(explainer, X)
+        get_local_waterfall_plot(subject_id=X.index[0], shap_value_object=shap_object)
+        shap_pool.warm((model_name, model_loader.version, model_loader.run_id), model_loader.shap_mode, model_loader.tree_fraction, X)
+
+    return details
+
+def prewarm_models(model_names):
+    # Import what explaining needs one module at a time, so the startup report times each of them
+    if model_names:
+        for module in (mlflow, pd, joblib, shap, mpl_figure, mpl_backend_agg, mpl_cm, mpl_transforms):
+            module._load()
+
+    for model_name in model_names:
+        start = time.perf_counter()
+        try:
+            status = {"status": "ready", **warm_up_model(model_name)}
+            logger.info(f"✅ Prewarmed model: {model_name}")
+        except Exception as e:
+            status = {"status": "error", "error": str(e)}
+            logger.error(f"❌ Failed to prewarm model {model_name}: {e}")
+        status["seconds"] = round(time.perf_counter() - start, 3)
+        startup_status["models"][model_name] = status
+
+    startup_status["ready"] = True
+    startup_timings["ready_seconds"] = seconds_since_process_start()
+    logger.info(f"✅ Ready {startup_timings['ready_seconds']}s after process start: {json.dumps(get_startup_report())}")
+
+@app.before_request
+def track_first_request():
+    if "first_request" not in startup_timings and not request.path.startswith("/v1/health"):
+        request.environ["startup.request_start"] = time.perf_counter()
+
+@app.after_request
+def record_first_request(response):
+    request_start = request.environ.get("startup.request_start")
+    if request_start is not None and "first_request" not in startup_timings:
+        startup_timings["first_request"] = {
+            "path": request.path,
+            "status": response.status_code,
+            "seconds": round(time.perf_counter() - request_start, 3),
+            "since_process_start_seconds": seconds_since_process_start(),
+        }
+    return response
+
+# Health api
+@app.route("/v1/health/live", methods=["GET"])
+def health_live():
+    return jsonify({"status": "alive"})
+
+@app.route("/v1/health/ready", methods=["GET"])
+def health_ready():
+    if not startup_status["ready"]:
+        return jsonify({"status": "warming_up", "models": startup_status["models"]}), 503
+    return jsonify({"status": "ready", "models": startup_status["models"]})
+
+@app.route("/v1/health/startup", methods=["GET"])
+def health_startup():
+    return jsonify(get_startup_report())
+
+def parse_shap_options(req_json):
+    """
+    Read the optional "shap_mode" (one of SHAP_MODES) and "tree_fraction" (0 < f <= 1,
+    share of forest trees to explain with) from a request body. Only "interventional"
+    returns the exact SHAP values of the logged explainer, "fast" is path-dependent
+    TreeSHAP and differs from it numerically.
+    Returns (shap_mode, tree_fraction, error).
+    """
+    shap_mode = req_json.get("shap_mode", SHAP_MODE)
+    if shap_mode not in SHAP_MODES:
+        return None, None, f"Invalid 'shap_mode'. Expecting one of {list(SHAP_MODES)}."
+
+    tree_fraction = req_json.get("tree_fraction", 1.0)
+    if isinstance(tree_fraction, bool) or not isinstance(tree_fraction, (int, float)) or not 0 < tree_fraction <= 1:
+        return None, None, "Invalid 'tree_fraction'. Expecting a number in (0, 1]."
+    if tree_fraction < 1 and shap_mode == "interventional":
+        return None, None, "'tree_fraction' requires shap_mode 'fast' or 'approximate'."
+    return shap_mode, float(tree_fraction), None
+
+def parse_class_index(req_json):
+    """
+    Read the optional "class_index" (default 1, the positive class) from a request body,
+    either a class index or "all" for every class. Returns (class_index, error).
+    """
+    class_index = req_json.get("class_index", 1)
+    if class_index == "all" or (isinstance(class_index, int) and not isinstance(class_index, bool) and class_index >= 0):
+        return class_index, None
+    return None, "Invalid 'class_index'. Expecting a non-negative class index or 'all'."
 
-        if "dataframe_split" not in req_json or "data" not in req_json["dataframe_split"] or "columns" not in req_json["dataframe_split"]:
-            return jsonify({"error": "Invalid request format. Expecting 'dataframe_split' with 'data' and 'columns'."}), 400
+def parse_render_options(req_json):
+    """
+    Read the optional "render" (one of RENDER_MODES, default "png") and "array_encoding"
+    (one of ARRAY_ENCODINGS, for render "data") from a request body.
+    Returns (render, array_encoding, error).
+    """
+    render = req_json.get("render", "png")
+    if render not in RENDER_MODES:
+        return None, None, f"Invalid 'render'. Expecting one of {list(RENDER_MODES)}."
+    array_encoding = req_json.get("array_encoding", "list")
+    if array_encoding not in ARRAY_ENCODINGS:
+        return None, None, f"Invalid 'array_encoding'. Expecting one of {list(ARRAY_ENCODINGS)}."
+    return render, array_encoding, None
 
-        # Convert input data to DataFrame
-        columns = req_json["dataframe_split"]["columns"]
-        data = req_json["dataframe_split"]["data"]
+STORE_PREFIX_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._/-]*")
 
-        input_df = pd.DataFrame(data=data, columns=columns)
-        logger.info(input_df.head())
-        # Transform input DataFrame to match model requirements
-        input_data = transformer(input_df, input_columns)  
-        logger.info(input_data.head())
+def parse_response_options(req_json, render):
+    """
+    Read the optional "response_format" (one of RESPONSE_FORMATS, default "json") and,
+    for "key", "store_prefix" (the object key prefix the PNGs are written under, default
+    derived from the response ETag) from a request body.
+    Returns (response_format, store_prefix, error).
+    """
+    response_format = req_json.get("response_format", "json")
+    if response_format not in RESPONSE_FORMATS:
+        return None, None, f"Invalid 'response_format'. Expecting one of {list(RESPONSE_FORMATS)}."
+    if response_format != "json" and render != "png":
+        return None, None, f"response_format '{response_format}' requires render 'png'."
+    if response_format != "key":
+        return response_format, None, None
+
+    if plot_store is None:
+        return None, None, "response_format 'key' requires PLOT_STORE_BUCKET to be configured."
+    store_prefix = req_json.get("store_prefix")
+    if store_prefix is not None and (
+        not isinstance(store_prefix, str)
+        or not STORE_PREFIX_PATTERN.fullmatch(store_prefix)
+        or ".." in store_prefix.split("/")
+    ):
+        return None, None, "Invalid 'store_prefix'. Expecting a relative key path of letters, digits and . _ - /"
+    return response_format, store_prefix and store_prefix.strip("/"), None
+
+def parse_stream_option(req_json, response_format):
+    """
+    Read the optional "stream" (default false) from a request body: stream waterfalls
+    as NDJSON lines while they render. Returns (stream, error).
+    """
+    stream = req_json.get("stream", False)
+    if not isinstance(stream, bool):
+        return None, "Invalid 'stream'. Expecting true or false."
+    if stream and response_format not in ("json", "key"):
+        return None, "'stream' requires response_format 'json' or 'key'."
+    return stream, None
+
+def parse_cohort_option(req_json, render, n_rows):
+    """
+    Read the optional "cohort_rendering" (one of COHORT_RENDERINGS, default "auto") from a
+    request body and resolve it for n_rows input rows, see LARGE_COHORT_ROWS. Data-only
+    payloads are never reduced. Returns (cohort_rendering, error).
+    """
+    cohort_rendering = req_json.get("cohort_rendering", "auto")
+    if cohort_rendering not in COHORT_RENDERINGS:
+        return None, f"Invalid 'cohort_rendering'. Expecting one of {list(COHORT_RENDERINGS)}."
+    if render != "png":
+        return "full", None
+    return resolve_cohort_rendering(cohort_rendering, n_rows), None
+
+def check_class_index(shap_tensor, class_index):
+    if class_index != "all" and class_index >= shap_tensor.n_classes:
+        return f"Invalid 'class_index'. The model explains {shap_tensor.n_classes} classes."
+    return None
+
+class ExplainOptions:
+    def __init__(self, shap_mode, tree_fraction, class_index, render, array_encoding, response_format, store_prefix, stream, cohort_rendering):
+        self.shap_mode = shap_mode
+        self.tree_fraction = tree_fraction
+        self.class_index = class_index
+        self.render = render
+        self.array_encoding = array_encoding
+        self.response_format = response_format
+        self.store_prefix = store_prefix
+        self.stream = stream
+        self.cohort_rendering = cohort_rendering
+
+def parse_explain_options(req_json, n_rows):
+    """
+    Read every option the explain endpoints take from a request body with n_rows input
+    rows, see the parse_* helpers above. Returns (options, error).
+    """
+    shap_mode, tree_fraction, error = parse_shap_options(req_json)
+    if error:
+        return None, error
+    class_index, error = parse_class_index(req_json)
+    if error:
+        return None, error
+    render, array_encoding, error = parse_render_options(req_json)
+    if error:
+        return None, error
+    response_format, store_prefix, error = parse_response_options(req_json, render)
+    if error:
+        return None, error
+    stream, error = parse_stream_option(req_json, response_format)
+    if error:
+        return None, error
+    cohort_rendering, error = parse_cohort_option(req_json, render, n_rows)
+    if error:
+        return None, error
+    return ExplainOptions(shap_mode, tree_fraction, class_index, render, array_encoding, response_format, store_prefix, stream, cohort_rendering), None
+
+class ExplainContext:
+    """
+    Cache and ETag handling shared by the explain endpoints for one parsed request: the
+    plot cache key and ETag of the requested outputs, their cached plots, and the SHAP
+    tensor of the input rows, only computed when a plot missed the cache or SHAP values
+    are asked for. Missing plots are rendered and cached on first get_plot.
+    """
+
+    def __init__(self, endpoint, outputs, model_loader, explainer, input_data, options):
+        self.outputs = outputs
+        self.model_loader = model_loader
+        self.explainer = explainer
+        self.input_data = input_data
+        self.options = options
+        self.plot_key = get_plot_key(
+            model_loader, input_data, options.class_index, options.render, options.array_encoding, options.cohort_rendering
+        )
+        self.etag = get_etag(endpoint, sorted(set(outputs)), *self.plot_key, options.response_format, options.store_prefix, options.stream)
+        self.plots = None
+        self.shap_tensor = None
+
+    def load(self, shap_values=False):
+        """Look the plots up in the cache and compute SHAP values if needed, returns an error for a bad class_index."""
+        self.plots = {output: plot_cache.get((output,) + self.plot_key) for output in self.outputs if output in PLOT_OUTPUTS}
+        if shap_values or any(plot is None for plot in self.plots.values()):
+            self.shap_tensor = get_shap_tensor(self.explainer, X=self.input_data, model_loader=self.model_loader)
+            return check_class_index(self.shap_tensor, self.options.class_index)
+        return None
+
+    def get_plot(self, output):
+        plot = self.plots[output]
+        if plot is None:
+            options = self.options
+            plot = render_output(output, self.shap_tensor, options.class_index, options.render, options.array_encoding, options.cohort_rendering)
+            plot_cache.put((output,) + self.plot_key, plot)
+            self.plots[output] = plot
+        return plot
+
+    def iter_waterfalls(self):
+        """(row position, waterfall entry) pairs, from the cache or rendered as they finish."""
+        if self.plots["waterfall"] is not None:
+            return enumerate(self.plots["waterfall"])
+        options = self.options
+        return iter_waterfalls_cached(("waterfall",) + self.plot_key, self.shap_tensor, options.class_index, options.render, options.array_encoding)
+
+    def metadata(self):
+        """The class index, SHAP mode, feature perturbation and tree fraction used, and the cohort rendering of heatmap and beeswarm."""
+        metadata = {
+            "class_index": self.options.class_index,
+            "shap_mode": self.model_loader.shap_mode,
+            "feature_perturbation": SHAP_MODE_PERTURBATION[self.model_loader.shap_mode],
+            "tree_fraction": self.model_loader.tree_fraction,
+        }
+        if "heatmap" in self.plots or "beeswarm" in self.plots:
+            metadata["cohort_rendering"] = get_cohort_report(self.options.cohort_rendering, len(self.input_data))
+        return metadata
+
+def read_explain_request(model_loader, input_columns, req_json):
+    """
+    Parse and align the input rows of an explain request, read its options and select
+    the explainer they ask for. Returns (input_data, explainer, options, error).
+    """
+    input_df, error = read_input_frame(req_json)
+    if error:
+        return None, None, None, error
+
+    # Log the shape only, formatting the frame costs more than a cached response
+    logger.info(f"Input shape: {input_df.shape}")
+    # Transform input DataFrame to match model requirements
+    input_data = transformer(input_df, input_columns)
+
+    options, error = parse_explain_options(req_json, len(input_data))
+    if error:
+        return None, None, None, error
+    explainer = model_loader.get_explainer(options.shap_mode, options.tree_fraction)
+    return input_data, explainer, options, None
+
+def explain_plot_response(model_name, plot, req_json, if_none_match=()):
+    """Single-plot endpoints: one of PLOT_OUTPUTS under "explain", with the options of the combined endpoint."""
+    model_loader = ModelLoader(model_name)
+    model, input_columns, _ = model_loader.load()
 
-        shap_object = get_shap_value(explainer, X=input_data)
-        heatmap = get_heatmap(shap_object.explanation)
+    if model is None:
+        return jsonify({"error": f"Model {model_name} not found"}), 404
+    try:
+        input_data, explainer, options, error = read_explain_request(model_loader, input_columns, req_json)
+        if error:
+            return jsonify({"error": error}), 400
+        if options.stream and plot != "waterfall":
+            return jsonify({"error": "'stream' is only supported for waterfall."}), 400
+
+        context = ExplainContext(plot, [plot], model_loader, explainer, input_data, options)
+        if context.etag in if_none_match:
+            return not_modified(context.etag)
+        error = context.load()
+        if error:
+            return jsonify({"error": error}), 400
+
+        if options.stream:
+            return waterfall_stream_response(
+                context.etag,
+                {**context.metadata(), "rows": len(input_data)},
+                context.iter_waterfalls(),
+                options.response_format,
+                options.store_prefix
+            )
+        return plot_response(
+            context.etag,
+            context.metadata(),
+            {"explain": (plot, lambda: context.get_plot(plot))},
+            options.response_format,
+            options.store_prefix
+        )
 
-        return jsonify({"explain": heatmap})
-    
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Model and prediction api
+@app.route("/v1/explain/beeswarm/<model_name>", methods=["POST"])
+def explain_beeswarm(model_name):
+    return explain_plot_response(model_name, "beeswarm", request.get_json(), request.if_none_match)
+
+@app.route("/v1/explain/heatmap/<model_name>", methods=["POST"])
+def explain_heatmap(model_name):
+    return explain_plot_response(model_name, "heatmap", request.get_json(), request.if_none_match)
+
 @app.route("/v1/explain/waterfall/<model_name>", methods=["POST"])
 def explain_waterfall(model_name):
+    return explain_plot_response(model_name, "waterfall", request.get_json(), request.if_none_match)
+
+def predict_response(model_name, req_json):
     model_loader = ModelLoader(model_name)
     model, input_columns, explainer = model_loader.load()
     
     if model is None:
         return jsonify({"error": f"Model {model_name} not found"}), 404
     try:
-        req_json = request.get_json()
-
-        if "dataframe_split" not in req_json or "data" not in req_json["dataframe_split"] or "columns" not in req_json["dataframe_split"]:
-            return jsonify({"error": "Invalid request format. Expecting 'dataframe_split' with 'data' and 'columns'."}), 400
-
-        # Convert input data to DataFrame
-        columns = req_json["dataframe_split"]["columns"]
-        data = req_json["dataframe_split"]["data"]
+        input_df, error = read_input_frame(req_json)
+        if error:
+            return jsonify({"error": error}), 400
 
-        input_df = pd.DataFrame(data=data, columns=columns)
         logger.info(input_df.head())
         # Transform input DataFrame to match model requirements
         input_data = transformer(input_df, input_columns)  
         logger.info(input_data.head())
 
-        if len(input_data) != 1:
-            return jsonify({"error": "Waterfall explanation requires exactly one row of input"}), 400
-        
-        shap_object = get_shap_value(explainer, X=input_data)
-        explain = [
-            {
-                "id": idx,
-                 "waterfall": get_local_waterfall_plot(
-                        subject_id=idx,
-                        shap_value_object=shap_object
-                )
-            }
-            for idx in input_data.index
-        ]
+        predictions = get_predictions(model, input_data, run_id=model_loader.run_id)
 
-        return jsonify({"explain": explain})
+        return jsonify({"predict": predictions})
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/v1/predict/<model_name>", methods=["POST"])
 def predict(model_name):
+    return predict_response(model_name, request.get_json())
+
+EXPLAIN_OUTPUTS = ("predict", "heatmap", "beeswarm", "waterfall", "shap_values")
+
+def explain_response(model_name, req_json, if_none_match=()):
+    """
+    Combined endpoint: parse, transform, predict and compute SHAP values once, then
+    render every output listed in "outputs" (any of EXPLAIN_OUTPUTS) from that result.
+    """
     model_loader = ModelLoader(model_name)
-    model, input_columns, explainer = model_loader.load()
-    
+    model, input_columns, _ = model_loader.load()
+
     if model is None:
         return jsonify({"error": f"Model {model_name} not found"}), 404
     try:
-        req_json = request.get_json()
-
-        if "dataframe_split" not in req_json or "data" not in req_json["dataframe_split"] or "columns" not in req_json["dataframe_split"]:
-            return jsonify({"error": "Invalid request format. Expecting 'dataframe_split' with 'data' and 'columns'."}), 400
-
-        # Convert input data to DataFrame
-        columns = req_json["dataframe_split"]["columns"]
-        data = req_json["dataframe_split"]["data"]
-
-        input_df = pd.DataFrame(data=data, columns=columns)
-        logger.info(input_df.head())
-        # Transform input DataFrame to match model requirements
-        input_data = transformer(input_df, input_columns)  
-        logger.info(input_data.head())
+        input_data, explainer, options, error = read_explain_request(model_loader, input_columns, req_json)
+        if error:
+            return jsonify({"error": error}), 400
+
+        outputs = req_json.get("outputs")
+        if not isinstance(outputs, list) or not outputs or any(output not in EXPLAIN_OUTPUTS for output in outputs):
+            return jsonify({"error": f"Invalid 'outputs'. Expecting a non-empty list of {list(EXPLAIN_OUTPUTS)}."}), 400
+        if options.response_format == "image" and any(output not in PLOT_OUTPUTS for output in outputs):
+            return jsonify({"error": f"response_format 'image' only returns one of {list(PLOT_OUTPUTS)}."}), 400
+        if options.stream and ("waterfall" not in outputs or any(output not in ("predict", "waterfall") for output in outputs)):
+            return jsonify({"error": "'stream' returns one line per row, expecting 'outputs' of 'waterfall' and optionally 'predict'."}), 400
+
+        context = ExplainContext("explain", outputs, model_loader, explainer, input_data, options)
+        if context.etag in if_none_match:
+            return not_modified(context.etag)
+
+        result = {}
+        if "predict" in outputs:
+            result["predict"] = get_predictions(model, input_data, run_id=model_loader.run_id)
+
+        plots = {}
+        if any(output != "predict" for output in outputs):
+            error = context.load(shap_values="shap_values" in outputs)
+            if error:
+                return jsonify({"error": error}), 400
+
+            # Rendered by plot_response, a multipart response renders each plot as it streams
+            plots = {output: (output, lambda output=output: context.get_plot(output)) for output in context.plots}
+            result.update(context.metadata())
+            if "shap_values" in outputs:
+                result["shap_values"] = explain_classes(
+                    context.shap_tensor,
+                    options.class_index,
+                    lambda shap_object: {
+                        "base_value": float(shap_object.base_value),
+                        "feature_names": list(shap_object.shap_df.columns),
+                        "ids": shap_object.shap_df.index.tolist(),
+                        "values": shap_object.shap_df.values.tolist(),
+                    }
+                )
 
-        # Split abundance_concat into train and test data
-        test_ids = input_data.index
-        X_test = input_data.loc[test_ids]
-        
-        # Get predicted probability
-        y_pred_proba = model.predict_proba(X_test)[:, 1] 
-        y_pred_class = model.predict(X_test)
-        # Map to df
-        y_pred_proba_df = pd.DataFrame(y_pred_proba, index=X_test.index, columns=["Y_proba"])
-        y_pred_proba_df["Y_class"] = y_pred_class
-
-        predictions = [
-            {
-                "id": idx,
-                "proba": pred_proba,
-                "class": pred_class,
-            }
-            for idx, (pred_proba, pred_class) in zip(
-                y_pred_proba_df.index,
-                zip(y_pred_proba_df["Y_proba"], y_pred_proba_df["Y_class"])
+        if options.stream:
+            metadata = {key: value for key, value in result.items() if key != "predict"}
+            return waterfall_stream_response(
+                context.etag,
+                {**metadata, "rows": len(input_data)},
+                context.iter_waterfalls(),
+                options.response_format,
+                options.store_prefix,
+                predictions=result.get("predict")
             )
-        ]
+        return plot_response(context.etag, result, plots, options.response_format, options.store_prefix)
 
-        return jsonify({"predict": predictions})
-    
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/v1/explain/<model_name>", methods=["POST"])
+def explain(model_name):
+    return explain_response(model_name, request.get_json(), request.if_none_match)
+
+# Async jobs
+# Logic of the synchronous endpoint each job kind runs, called with (model_name, req_json)
+JOB_HANDLERS = {
+    "explain": explain_response,
+    "predict": predict_response,
+    "heatmap": lambda model_name, req_json: explain_plot_response(model_name, "heatmap", req_json),
+    "beeswarm": lambda model_name, req_json: explain_plot_response(model_name, "beeswarm", req_json),
+    "waterfall": lambda model_name, req_json: explain_plot_response(model_name, "waterfall", req_json),
+}
+JOB_ACTIVE_STATES = ("queued", "running")
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class JobStore:
+    """
+    Durable on-disk store of async jobs, shared by every worker process on the pod.
+
+    Each job is a directory holding request.json, job.json (status, progress, timings)
+    and once finished the response body in result, each written to a temp path and
+    renamed into place. The process that runs a job holds an exclusive file lock on it
+    from submit to finish, so a queued or running job whose lock is free has lost its
+    process (recycled or crashed) and can be taken over by another one.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        os.makedirs(location, exist_ok=True)
+
+    def _path(self, job_id, name):
+        return os.path.join(self.location, job_id, name)
+
+    def _write(self, job_id, name, chunks):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.location, job_id), suffix=".tmp")
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, self._path(job_id, name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def create(self, kind, model_name, body):
+        """Store a new queued job, returns (job, lock_file) with the job locked by the caller."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.location, job_id))
+        lock_file = self.lock(job_id)
+        self._write(job_id, "request.json", [body])
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "model_name": model_name,
+            "status": "queued",
+            "created_at": time.time(),
+            "attempts": 0,
+            "progress": {},
+        }
+        self.save(job)
+        return job, lock_file
+
+    def save(self, job):
+        self._write(job["job_id"], "job.json", [json.dumps(job).encode("utf-8")])
+
+    def get(self, job_id):
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id, "job.json"), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_request(self, job_id):
+        with open(self._path(job_id, "request.json"), "rb") as f:
+            return f.read()
+
+    def write_result(self, job_id, chunks):
+        return self._write(job_id, "result", chunks)
+
+    def result_path(self, job_id):
+        return self._path(job_id, "result")
+
+    def lock(self, job_id):
+        """The open, locked lock file of a job, or None when another process holds it."""
+        lock_file = open(self._path(job_id, "lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def delete(self, job_id):
+        shutil.rmtree(os.path.join(self.location, job_id), ignore_errors=True)
+
+    def list_ids(self):
+        return [name for name in os.listdir(self.location) if JOB_ID_PATTERN.match(name)]
+
+class JobRunner:
+    """
+    Runs async jobs on a local thread pool. A job calls the logic of the synchronous
+    endpoint of its kind (JOB_HANDLERS) with its request body, outside of any request,
+    so it accepts the same body and its result is the same response, saved to the job store to be fetched any number
+    of times. Streamed responses ("stream": true) report the rows done as progress.
+
+    Jobs left queued or running by a process that went away are resumed when polled,
+    or by the scan each process runs on the jobs API at most every recovery_seconds,
+    which also deletes finished jobs ttl_seconds after they finished.
+    """
+
+    def __init__(self, store, workers, max_pending, ttl_seconds, recovery_seconds):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.recovery_seconds = recovery_seconds
+        self._executor = None
+        self._pending = {}  # job_id -> (future, lock_file)
+        self._last_scan = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        return self._executor
+
+    def _start(self, job, lock_file):
+        # Caller must hold self._lock
+        # The job thread updates its own copy, callers keep the one they return
+        future = self._get_executor().submit(self._run, dict(job), lock_file)
+        self._pending[job["job_id"]] = (future, lock_file)
+
+    def submit(self, kind, model_name, body):
+        """Queue a job, returns None when max_pending jobs are already waiting in this process."""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                return None
+            job, lock_file = self.store.create(kind, model_name, body)
+            self._start(job, lock_file)
+        logger.info(f"✅ Queued {kind} job {job['job_id']} for model {model_name}")
+        return job
+
+    def _save_progress(self, job, chunks):
+        # NDJSON responses: the first line holds "rows", every later line is one row done
+        buffered = b""
+        rows_done = None
+        last_save = time.monotonic()
+        for chunk in chunks:
+            yield chunk
+            if rows_done is None:
+                buffered += chunk
+                if b"\n" not in buffered:
+                    continue
+                first_line, rest = buffered.split(b"\n", 1)
+                job["progress"] = {"rows": json.loads(first_line).get("rows"), "rows_done": 0}
+                rows_done = rest.count(b"\n")
+            else:
+                rows_done += chunk.count(b"\n")
+            job["progress"]["rows_done"] = rows_done
+            if time.monotonic() - last_save >= 0.5:
+                self.store.save(job)
+                last_save = time.monotonic()
+
+    def _run(self, job, lock_file):
+        job_id = job["job_id"]
+        start = time.perf_counter()
+        try:
+            job.update(status="running", started_at=time.time(), attempts=job["attempts"] + 1, worker_pid=os.getpid())
+            self.store.save(job)
+            req_json = json.loads(self.store.read_request(job_id))
+            # An app context for jsonify only, request hooks (startup timings, worker recycling) never see jobs
+            with app.app_context():
+                response = app.make_response(JOB_HANDLERS[job["kind"]](job["model_name"], req_json))
+                chunks = response.iter_encoded()
+                if response.mimetype == "application/x-ndjson":
+                    chunks = self._save_progress(job, chunks)
+                try:
+                    result_bytes = self.store.write_result(job_id, chunks)
+                finally:
+                    response.close()
+
+            job.update(
+                status="succeeded" if response.status_code < 400 else "failed",
+                status_code=response.status_code,
+                content_type=response.content_type,
+                result_bytes=result_bytes
+            )
+            if response.mimetype == "application/json" and response.status_code >= 400:
+                with open(self.store.result_path(job_id), "r") as f:
+                    job["error"] = json.load(f).get("error")
+            logger.info(f"✅ Finished {job['kind']} job {job_id} with status {response.status_code}")
+        except Exception as e:
+            job.update(status="failed", status_code=500, error=str(e))
+            logger.error(f"❌ Failed {job['kind']} job {job_id}: {e}")
+        finally:
+            job.update(finished_at=time.time(), seconds=round(time.perf_counter() - start, 3))
+            self.store.save(job)
+            with self._lock:
+                self._pending.pop(job_id, None)
+            lock_file.close()
+
+    def _resume_if_orphaned(self, job):
+        if job["status"] not in JOB_ACTIVE_STATES:
+            return job
+        with self._lock:
+            if job["job_id"] in self._pending:
+                return job
+            lock_file = self.store.lock(job["job_id"])
+            if lock_file is None:
+                return job  # running in another process
+            # It may have finished between reading it and taking the lock
+            job = self.store.get(job["job_id"])
+            if job is None or job["status"] not in JOB_ACTIVE_STATES:
+                lock_file.close()
+                return job
+            job.update(status="queued", progress={})
+            self.store.save(job)
+            self._start(job, lock_file)
+        logger.info(f"🔄 Resuming {job['kind']} job {job['job_id']} left behind by another process")
+        return job
+
+    def get(self, job_id):
+        job = self.store.get(job_id)
+        return self._resume_if_orphaned(job) if job is not None else None
+
+    def scan(self):
+        """Resume orphaned jobs and delete expired ones, at most every recovery_seconds."""
+        with self._lock:
+            if self._last_scan is not None and time.monotonic() - self._last_scan < self.recovery_seconds:
+                return
+            self._last_scan = time.monotonic()
+
+        for job_id in self.store.list_ids():
+            job = self.store.get(job_id)
+            if job is None:
+                continue
+            if job["status"] in JOB_ACTIVE_STATES:
+                self._resume_if_orphaned(job)
+            elif time.time() - job.get("finished_at", job["created_at"]) > self.ttl_seconds:
+                self.store.delete(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job still queued in this process, returns whether it was cancelled."""
+        with self._lock:
+            future, lock_file = self._pending.get(job_id, (None, None))
+            if future is None or not future.cancel():
+                return False
+            self._pending.pop(job_id)
+            job = self.store.get(job_id)
+            job.update(status="cancelled", finished_at=time.time())
+            self.store.save(job)
+            lock_file.close()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._pending), "workers": self.workers, "max_pending": self.max_pending}
+
+job_runner = JobRunner(
+    store=JobStore(os.getenv("JOB_STORE_DIR", os.path.join(os.getenv("ARTIFACT_CACHE_DIR", "/tmp/cache"), "jobs"))),
+    workers=int(os.getenv("JOB_WORKERS", "1")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "32")),
+    ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", "86400")),
+    recovery_seconds=float(os.getenv("JOB_RECOVERY_SECONDS", "30"))
+)
+
+@app.route("/v1/jobs/<kind>/<model_name>", methods=["POST"])
+def submit_job(kind, model_name):
+    """
+    Submit the body of a synchronous request (see JOB_HANDLERS) as an async job.
+    Returns 202 with the job, poll /v1/jobs/<job_id>, follow /v1/jobs/<job_id>/events
+    or fetch /v1/jobs/<job_id>/result once it finished.
+    """
+    if kind not in JOB_HANDLERS:
+        return jsonify({"error": f"Invalid job kind '{kind}'. Expecting one of {list(JOB_HANDLERS)}."}), 404
+    if not isinstance(request.get_json(silent=True), dict):
+        return jsonify({"error": "Expecting a JSON object body."}), 400
+    job_runner.scan()
+
+    job = job_runner.submit(kind, model_name, request.get_data())
+    if job is None:
+        return jsonify({"error": f"Too many pending jobs, at most {job_runner.max_pending} per worker."}), 429
+    return jsonify(job), 202, {"Location": f"/v1/jobs/{job['job_id']}"}
+
+@app.route("/v1/jobs", methods=["GET"])
+def list_jobs():
+    job_runner.scan()
+    jobs = [job for job in map(job_runner.store.get, job_runner.store.list_ids()) if job is not None]
+    status = request.args.get("status")
+    if status:
+        jobs = [job for job in jobs if job["status"] == status]
+    jobs.sort(key=lambda job: job["created_at"], reverse=True)
+    return jsonify({"jobs": jobs, "worker": job_runner.stats()})
+
+@app.route("/v1/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job)
+
+@app.route("/v1/jobs/<job_id>/events", methods=["GET"])
+def stream_job_events(job_id):
+    """NDJSON of the job's state, one line per change, until it finished."""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    poll_seconds = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "0.5"))
+
+    def generate(job):
+        yield json.dumps(job) + "\n"
+        while job is not None and job["status"] in JOB_ACTIVE_STATES:
+            time.sleep(poll_seconds)
+            latest = job_runner.get(job_id)
+            if latest != job:
+                job = latest
+                yield json.dumps(job if job is not None else {"job_id": job_id, "status": "deleted"}) + "\n"
+
+    return app.response_class(generate(job), mimetype="application/x-ndjson")
+
+@app.route("/v1/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    """The job's response body, content type and status code, as the synchronous endpoint returned them."""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    if "status_code" not in job:
+        return jsonify({"error": f"Job {job_id} has no result, it is {job['status']}", "status": job["status"]}), 409
+    if job["status_code"] == 500 and "content_type" not in job:
+        return jsonify({"error": job["error"]}), 500
+
+    response = send_file(job_runner.store.result_path(job_id), mimetype=job["content_type"], etag=job_id)
+    response.status_code = job["status_code"]
+    return response
+
+@app.route("/v1/jobs/<job_id>", methods=["DELETE"])
+def delete_job(job_id):
+    """Cancel a job still queued in this worker, or delete a finished job and its result."""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    if job["status"] in JOB_ACTIVE_STATES:
+        if not job_runner.cancel(job_id):
+            return jsonify({"error": f"Job {job_id} is {job['status']} and can no longer be cancelled"}), 409
+        return jsonify(job_runner.store.get(job_id))
+    job_runner.store.delete(job_id)
+    return jsonify({"job_id": job_id, "deleted": True})
+
 @app.route("/v1/models", methods=["GET"])
 def list_models():
     from requests.auth import HTTPBasicAuth
@@ -450,6 +3037,23 @@ def list_models():
         
     return jsonify(production_model)
 
+@app.route("/v1/registry/stats", methods=["GET"])
+def get_registry_stats():
+    stats = model_registry.stats()
+    stats["production_versions"] = production_resolver.versions()
+    return jsonify(stats)
+
+@app.route("/v1/batching/stats", methods=["GET"])
+def get_batching_stats():
+    return jsonify(predict_batcher.stats())
+
+@app.route("/v1/cache/stats", methods=["GET"])
+def get_cache_stats():
+    plots = plot_cache.stats()
+    if plot_store is not None:
+        plots["store"] = plot_store.stats()
+    return jsonify({"artifacts": artifact_store.stats(), "rows": row_cache.stats(), "plots": plots})
+
 # ML flow api
 @app.route("/v1/mlflow/tracking_uri", methods=["GET"])
 def get_mlflow_tracking_uri():
@@ -571,8 +3175,10 @@ def update_model_stage_by_run_id(run_id):
                 version=version,
                 description=description
             )
+        # Pick up the promotion on this pod without waiting for the TTL
+        production_resolver.refresh(model_name)
         return jsonify({"status": "success", "message": f"Model '{model_name}' version '{version}' transitioned to '{stage}'."})
-    except MlflowException as e:
+    except mlflow.exceptions.MlflowException as e:
         return {"status": "error", "message": str(e)}
 
 @app.route("/v1/mlflow/model/<model_name>/version/<version>/description", methods=["PUT"])
@@ -603,7 +3209,7 @@ def update_model_version_description(model_name, version):
             "description": description
         })
 
-    except MlflowException as e:
+    except mlflow.exceptions.MlflowException as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @app.route("/v1/mlflow/registered-models", methods=["GET"])
@@ -636,7 +3242,7 @@ def create_mlflow_user():
     username = data.get("username")
     password = data.get("password")
     tracking_uri = os.environ.get("MLFLOW_URL", None)
-    auth_client = get_app_client("basic-auth", tracking_uri=tracking_uri)
+    auth_client = mlflow_server.get_app_client("basic-auth", tracking_uri=tracking_uri)
     user = auth_client.create_user(username=username, password=password)
     return jsonify({"user": safe_jsonify(user)})
 
@@ -646,16 +3252,130 @@ def update_mlflow_user():
     username = data.get("username")
     password = data.get("password")
     tracking_uri = os.environ.get("MLFLOW_URL", None)
-    auth_client = get_app_client("basic-auth", tracking_uri=tracking_uri)
+    auth_client = mlflow_server.get_app_client("basic-auth", tracking_uri=tracking_uri)
     user = auth_client.update_user_password(username=username, password=password)
     return jsonify({"user": safe_jsonify(user)})
 
 @app.route("/v1/mlflow/user/<username>", methods=["GET"])
 def get_mlflow_user(username):
     tracking_uri = os.environ.get("MLFLOW_URL", None)
-    auth_client = get_app_client("basic-auth", tracking_uri=tracking_uri)
+    auth_client = mlflow_server.get_app_client("basic-auth", tracking_uri=tracking_uri)
     user = auth_client.get_user(username=username)
     return jsonify({"user": safe_jsonify(user)})
 
+# Production server
+def read_container_limits():
+    """
+    CPU (cores) and memory (bytes) available to the container: the cgroup v2 or v1 limits
+    when set, otherwise the CPUs this process may run on and the host's memory.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    memory = psutil.virtual_memory().total
+
+    def read(path):
+        try:
+            with open(path) as f:
+                return f.read().split()
+        except OSError:
+            return None
+
+    cpu_max = read("/sys/fs/cgroup/cpu.max")
+    if cpu_max is not None:
+        if cpu_max[0] != "max":
+            cpus = min(cpus, int(cpu_max[0]) / int(cpu_max[1]))
+    else:
+        quota, period = read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if quota and period and int(quota[0]) > 0:
+            cpus = min(cpus, int(quota[0]) / int(period[0]))
+
+    # cgroup v1 reports no limit as a huge number, hence the min with the host's memory
+    memory_max = read("/sys/fs/cgroup/memory.max") or read("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    if memory_max and memory_max[0] != "max":
+        memory = min(memory, int(memory_max[0]))
+    return cpus, memory
+
+def get_server_settings():
+    """
+    Worker processes, threads and recycling limits of the production server. Each setting
+    has an env var, unset ones are derived from the container limits: one worker per whole
+    CPU as long as each gets WORKER_MEMORY_MB, and a worker RSS cap that splits 90% of the
+    memory limit between the workers.
+    """
+    cpus, memory = read_container_limits()
+    memory_mb = memory // (1024 * 1024)
+    derived_workers = max(1, min(int(cpus), memory_mb // int(os.getenv("WORKER_MEMORY_MB", "1024"))))
+    workers = int(os.getenv("SERVER_WORKERS", str(derived_workers)))
+    max_requests = int(os.getenv("SERVER_MAX_REQUESTS", "1000"))
+    return {
+        "cpu_limit": round(cpus, 2),
+        "memory_limit_mb": memory_mb,
+        "workers": workers,
+        "threads": int(os.getenv("SERVER_THREADS", "4")),
+        "max_requests": max_requests,
+        "max_requests_jitter": int(os.getenv("SERVER_MAX_REQUESTS_JITTER", str(max_requests // 10))),
+        "worker_max_rss_mb": int(os.getenv("WORKER_MAX_RSS_MB", str(int(memory_mb * 0.9 / workers)))),
+        "timeout": int(os.getenv("SERVER_TIMEOUT", "300")),
+        "graceful_timeout": int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")),
+    }
+
+def reset_after_fork():
+    # Thread and process pools do not survive fork, every worker starts its own
+    global artifact_fetch_pool, render_pool
+    artifact_fetch_pool = new_artifact_fetch_pool()
+    render_pool = new_render_pool()
+    shap_pool._executor = None
+    shap_pool._lock = threading.Lock()
+    job_runner._executor = None
+    job_runner._lock = threading.Lock()
+
+def run_production_server(port):
+    """
+    Serve the app with gunicorn gthread workers. Models are prewarmed in the master before
+    the workers fork, so they share its copy-on-write pages instead of loading a copy each,
+    and workers are recycled gracefully after max_requests requests (with jitter, so they
+    do not restart together) or once their RSS passes worker_max_rss_mb.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    settings = get_server_settings()
+    startup_timings["server"] = settings
+    if settings["worker_max_rss_mb"] <= model_registry.max_rss_bytes // (1024 * 1024):
+        logger.warning(f"⚠️ WORKER_MAX_RSS_MB {settings['worker_max_rss_mb']} is not above MODEL_REGISTRY_MAX_RSS_MB, workers may recycle after every model load")
+    logger.info(f"✅ Production server settings: {json.dumps(settings)}")
+
+    prewarm_models(get_preload_model_names())
+    # The master's SHAP workers would sit idle, each worker starts its own pool on demand
+    shap_pool.shutdown()
+    # Keep the collector from writing to (and so copying) every page of the prewarmed objects in the workers
+    gc.collect()
+    gc.freeze()
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+    def recycle_over_rss(worker, req, environ, resp):
+        rss_mb = psutil.Process().memory_info().rss // (1024 * 1024)
+        if rss_mb > settings["worker_max_rss_mb"] and worker.alive:
+            logger.warning(f"⚠️ Worker {worker.pid} RSS {rss_mb}MB over {settings['worker_max_rss_mb']}MB, recycling it")
+            worker.alive = False
+
+    class ModelServerApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{port}")
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("post_request", recycle_over_rss)
+            for key in ("workers", "threads", "max_requests", "max_requests_jitter", "timeout", "graceful_timeout"):
+                self.cfg.set(key, settings[key])
+
+        def load(self):
+            return app
+
+    ModelServerApplication().run()
+
+startup_timings["module_import_seconds"] = round(time.time() - module_import_start, 3)
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080)
\ No newline at end of file
+    port = int(os.getenv("PORT", "8080"))
+    if os.getenv("SERVER_MODE", "production") == "development":
+        threading.Thread(target=prewarm_models, args=(get_preload_model_names(),), daemon=True).start()
+        app.run(host="0.0.0.0", port=port)
+    else:
+        run_production_server(port)
\ No newline at end of file
@@ -13,7 +13,10 @@ setup(
     install_requires=[
         "mlflow",
         "shap",
-        "joblib"
+        "joblib",
+        "numpy",
+        "pandas",
+        "scikit-learn"
     ],
     classifiers=[
         "Programming Language :: Python :: 3",